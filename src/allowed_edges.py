@@ -0,0 +1,120 @@
+import numpy as np
+from modular_matrix import DEFAULT_PRIME, random_tutte_matrix
+from skew_factorization import skew_inverse, skew_rank
+from graph_utils import connected_components
+
+
+class ComponentInverse:
+    RETRY_LIMIT = 10
+
+    def __init__(self, num_vertices, edges, p=DEFAULT_PRIME, rng=None):
+        # A component with maximum matching size nu gets k = n - 2 nu extra
+        # vertices adjacent to all of its vertices. The augmented graph has a
+        # perfect matching, and its perfect matchings restrict to exactly the
+        # maximum matchings of the component, so one inverse of its Tutte
+        # matrix answers every query below.
+        rng = np.random.default_rng() if rng is None else rng
+        self.num_vertices = num_vertices
+        self.prime = p
+        for attempt in range(self.RETRY_LIMIT):
+            tutte = random_tutte_matrix(num_vertices, edges, p, rng)
+            self.extra = num_vertices - skew_rank(tutte, p)
+            size = num_vertices + self.extra
+            augmented = np.zeros((size, size), dtype=np.int64)
+            augmented[:num_vertices, :num_vertices] = tutte
+            links = rng.integers(1, p, (num_vertices, self.extra))
+            augmented[:num_vertices, num_vertices:] = links
+            augmented[num_vertices:, :num_vertices] = (p - links).T
+            try:
+                self.inverse = skew_inverse(augmented, p)
+                return
+            except np.linalg.LinAlgError:
+                print(f"Singular augmented Tutte matrix on attempt {attempt + 1}")
+        raise np.linalg.LinAlgError("Unable to compute a nonsingular augmented Tutte matrix after several attempts")
+
+    def matching_size(self):
+        return (self.num_vertices - self.extra) // 2
+
+    def allowed(self, u, v):
+        return self.inverse[u, v] != 0
+
+    def missable(self, u):
+        # G - u keeps a maximum matching of G exactly when u can be matched
+        # to an extra vertex, i.e. when the inverse entry with one is nonzero.
+        if self.extra == 0:
+            return np.zeros(len(u), dtype=bool)
+        return self.inverse[u, self.num_vertices] != 0
+
+    def both_missable(self, u, v):
+        # u and v are both missed by one maximum matching exactly when G' minus
+        # u, v and two extra vertices w, x keeps a perfect matching. By Jacobi's
+        # identity that minor is nonzero iff the Pfaffian of the inverse
+        # restricted to {u, v, w, x} is.
+        if self.extra < 2:
+            return np.zeros(len(u), dtype=bool)
+        N, p = self.inverse, self.prime
+        w, x = self.num_vertices, self.num_vertices + 1
+        pfaffian = (N[u, v] * N[w, x] % p - N[u, w] * N[v, x] % p + N[u, x] * N[v, w] % p) % p
+        return (pfaffian != 0) & (u != v)
+
+
+class AllowedEdgeReport:
+    def __init__(self, num_vertices, edges, p=DEFAULT_PRIME, rng=None):
+        rng = np.random.default_rng() if rng is None else rng
+        self.edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.labels = np.empty(num_vertices, dtype=np.int64)
+        self.positions = np.empty(num_vertices, dtype=np.int64)
+        self.components = []
+        components = connected_components(num_vertices, self.edges)
+        for label, vertices in enumerate(components):
+            self.labels[vertices] = label
+            self.positions[vertices] = np.arange(len(vertices))
+        edge_labels = self.labels[self.edges[:, 0]]
+        order = np.argsort(edge_labels, kind="stable")
+        offsets = np.searchsorted(edge_labels[order], np.arange(len(components) + 1))
+        for label, vertices in enumerate(components):
+            local = self.positions[self.edges[order[offsets[label]:offsets[label + 1]]]]
+            self.components.append(ComponentInverse(len(vertices), local, p, rng))
+
+    def matching_size(self):
+        return sum(component.matching_size() for component in self.components)
+
+    def grouped(self, u):
+        labels = self.labels[u]
+        for label in np.unique(labels):
+            yield label, np.flatnonzero(labels == label)
+
+    def allowed_mask(self):
+        # Edge (u, v) lies in some maximum matching iff its inverse entry is
+        # nonzero (Rabin-Vazirani), here for every edge of the array at once.
+        mask = np.zeros(len(self.edges), dtype=bool)
+        for label, rows in self.grouped(self.edges[:, 0]):
+            local = self.positions[self.edges[rows]]
+            mask[rows] = self.components[label].allowed(local[:, 0], local[:, 1])
+        return mask
+
+    def missable_mask(self, vertices=None):
+        vertices = np.arange(len(self.labels)) if vertices is None else np.asarray(vertices, dtype=np.int64)
+        mask = np.zeros(len(vertices), dtype=bool)
+        for label, rows in self.grouped(vertices):
+            mask[rows] = self.components[label].missable(self.positions[vertices[rows]])
+        return mask
+
+    def increases_matching(self, pairs):
+        # Adding (u, v) raises nu(G) iff some maximum matching misses both.
+        # Across components that holds iff each endpoint is missable alone.
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        result = self.missable_mask(pairs[:, 0]) & self.missable_mask(pairs[:, 1])
+        same = np.flatnonzero(self.labels[pairs[:, 0]] == self.labels[pairs[:, 1]])
+        for label, rows in self.grouped(pairs[same, 0]):
+            local = self.positions[pairs[same[rows]]]
+            result[same[rows]] = self.components[label].both_missable(local[:, 0], local[:, 1])
+        return result
+
+
+def allowed_edge_mask(num_vertices, edges, p=DEFAULT_PRIME, rng=None):
+    return AllowedEdgeReport(num_vertices, edges, p, rng).allowed_mask()
+
+
+def increases_matching(num_vertices, edges, pairs, p=DEFAULT_PRIME, rng=None):
+    return AllowedEdgeReport(num_vertices, edges, p, rng).increases_matching(pairs)
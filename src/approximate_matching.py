@@ -0,0 +1,219 @@
+import time
+import numpy as np
+from graph_utils import neighbors_of, to_csr
+from bit_adjacency import BitAdjacency
+
+# At this edge density the greedy warm start runs on bitset rows instead of
+# the CSR lists.
+DENSE_DENSITY = 0.1
+
+
+class AnytimeResult:
+    def __init__(self, mate, max_length, elapsed):
+        self.matching = [(int(u), int(mate[u])) for u in np.flatnonzero(mate > np.arange(len(mate)))]
+        self.size = len(self.matching)
+        # With no augmenting path of length <= 2k - 1 every path in M xor M*
+        # has at least k edges of M, so |M| >= k / (k + 1) * nu(G).
+        k = (max_length + 1) // 2
+        exact = max_length >= len(mate) - 1 or self.size == len(mate) // 2
+        self.guarantee = 1.0 if exact else k / (k + 1)
+        self.upper_bound = self.size if exact else min(len(mate) // 2, self.size * (k + 1) // k)
+        self.max_length = max_length
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return f"AnytimeResult(size={self.size}, upper_bound={self.upper_bound}, guarantee={self.guarantee:.3f})"
+
+
+def greedy_matching(num_vertices, indptr, indices):
+    mate = np.full(num_vertices, -1, dtype=np.int64)
+    # Low-degree vertices first: they have the fewest chances to be matched later.
+    degrees = np.diff(indptr)
+    for u in np.argsort(degrees, kind="stable"):
+        if mate[u] != -1:
+            continue
+        neighbors = indices[indptr[u]:indptr[u + 1]]
+        free = neighbors[mate[neighbors] == -1]
+        free = free[free != u]
+        if len(free):
+            v = free[np.argmin(degrees[free])]
+            mate[u] = v
+            mate[v] = u
+    return mate
+
+
+def dense_greedy_matching(adjacency):
+    n = adjacency.num_vertices
+    mate = np.full(n, -1, dtype=np.int64)
+    degrees = adjacency.degrees()
+    free = adjacency.pack(np.arange(n))
+    for u in np.argsort(degrees, kind="stable"):
+        if mate[u] != -1:
+            continue
+        free_neighbors = adjacency.neighbors(u, free)
+        if len(free_neighbors):
+            v = free_neighbors[np.argmin(degrees[free_neighbors])]
+            mate[u] = v
+            mate[v] = u
+            adjacency.discard(free, [u, v])
+    return mate
+
+
+def warm_start(num_vertices, edges, indptr, indices):
+    if len(indices) >= DENSE_DENSITY * num_vertices * (num_vertices - 1):
+        return dense_greedy_matching(BitAdjacency.from_edges(num_vertices, edges))
+    return greedy_matching(num_vertices, indptr, indices)
+
+
+def extend_matching(num_vertices, edges, mate):
+    # Greedy on the edges whose endpoints the given matching leaves free.
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    mate = np.array(mate, dtype=np.int64)
+    free = mate == -1
+    rest = edges[free[edges[:, 0]] & free[edges[:, 1]]]
+    greedy = warm_start(num_vertices, rest, *to_csr(num_vertices, rest))
+    mate[greedy != -1] = greedy[greedy != -1]
+    return mate
+
+
+def expired(deadline):
+    return deadline is not None and time.perf_counter() > deadline
+
+
+def alternating_layers(indptr, indices, mate, max_length, deadline=None):
+    # Breadth-first search over (vertex, parity) states from every free
+    # vertex, as in Hopcroft-Karp: even[v] is the length of the shortest
+    # alternating walk that ends at v with a matched edge (0 for free
+    # vertices), odd[v] one that ends with an unmatched edge. Every
+    # augmenting path is such a walk, so none is shorter than the first
+    # layer that gives a free vertex an odd label, and there is none at all
+    # if the states run out first. The search goes on to max_length, or past
+    # it to that first layer. Returns the labels, the first layer (None if
+    # there is none) and whether the states ran out, or None once the
+    # deadline has passed.
+    n = len(mate)
+    even = np.full(n, -1, dtype=np.int64)
+    odd = np.full(n, -1, dtype=np.int64)
+    frontier = np.flatnonzero(mate == -1)
+    even[frontier] = 0
+    shortest = None
+    layer = 1
+    while len(frontier) and (shortest is None or layer <= max_length):
+        if expired(deadline):
+            return None
+        counts = indptr[frontier + 1] - indptr[frontier]
+        sources = np.repeat(frontier, counts)
+        targets = neighbors_of(indptr, indices, frontier)
+        targets = np.unique(targets[(odd[targets] == -1) & (targets != mate[sources])])
+        odd[targets] = layer
+        if shortest is None and np.any(mate[targets] == -1):
+            shortest = layer
+        frontier = mate[targets[mate[targets] != -1]]
+        frontier = frontier[even[frontier] == -1]
+        even[frontier] = layer + 1
+        layer += 2
+    return even, odd, shortest, len(frontier) == 0
+
+
+def disjoint_augmenting_paths(indptr, indices, mate, even, odd, deadline=None):
+    # Depth-first search from each free vertex that only steps from one layer
+    # to the next, so every path found is simple and as short as its end
+    # allows. A vertex is visited at most once per phase, which makes the
+    # paths vertex-disjoint and the phase linear in the graph. Returns the
+    # paths and whether the search finished before the deadline.
+    used = np.zeros(len(mate), dtype=bool)
+    paths = []
+    for root in np.flatnonzero(even == 0).tolist():
+        if used[root]:
+            continue
+        if expired(deadline):
+            return paths, False
+        used[root] = True
+        path = [root]
+        stack = [[root, int(indptr[root])]]
+        while stack:
+            v, i = stack[-1]
+            if i == indptr[v + 1]:
+                stack.pop()
+                del path[-2 if stack else -1:]
+                continue
+            stack[-1][1] += 1
+            w = int(indices[i])
+            if used[w] or odd[w] != even[v] + 1:
+                continue
+            used[w] = True
+            if mate[w] == -1:
+                paths.append(path + [w])
+                break
+            x = int(mate[w])
+            used[x] = True
+            path += [w, x]
+            stack.append([x, int(indptr[x])])
+    return paths, True
+
+
+def augment(mate, path):
+    for u, v in zip(path[0::2], path[1::2]):
+        mate[u] = v
+        mate[v] = u
+
+
+def anytime_matching(num_vertices, edges, epsilon=None, time_budget=None, initial=None):
+    started = time.perf_counter()
+    deadline = None if time_budget is None else started + time_budget
+    indptr, indices = to_csr(num_vertices, edges)
+    if initial is None:
+        mate = warm_start(num_vertices, edges, indptr, indices)
+    else:
+        mate = extend_matching(num_vertices, edges, initial)
+    # max_length is the longest augmenting path ruled out so far, searched
+    # the length the search has reached. With odd cycles a closed
+    # alternating walk through a free vertex can stand in for a path, and
+    # then the search moves on to longer paths without raising the bound.
+    max_length = searched = 1
+    yield AnytimeResult(mate, max_length, time.perf_counter() - started)
+
+    while True:
+        searched = max(searched, max_length)
+        k = (searched + 1) // 2
+        if epsilon is not None and k / (k + 1) >= 1 - epsilon:
+            return
+        if searched >= num_vertices - 1 or np.count_nonzero(mate == -1) < 2:
+            return
+        searched += 2
+        # Phases of one layered search and one round of vertex-disjoint
+        # augmentations each, until no augmenting walk is as short as
+        # searched or no path can be taken out of the layers.
+        while True:
+            layers = alternating_layers(indptr, indices, mate, searched, deadline)
+            if layers is None:
+                yield AnytimeResult(mate, max_length, time.perf_counter() - started)
+                return
+            even, odd, shortest, exhausted = layers
+            if shortest is None:
+                max_length = num_vertices - 1
+                break
+            max_length = max(max_length, shortest - 2)
+            if shortest > searched:
+                break
+            paths, finished = disjoint_augmenting_paths(indptr, indices, mate, even, odd, deadline)
+            for path in paths:
+                augment(mate, path)
+            if not finished:
+                yield AnytimeResult(mate, max_length, time.perf_counter() - started)
+                return
+            if not paths:
+                break
+        if exhausted and shortest is not None and shortest <= searched:
+            # Only closed walks are left, and longer lengths reach no new state.
+            yield AnytimeResult(mate, max_length, time.perf_counter() - started)
+            return
+        yield AnytimeResult(mate, max_length, time.perf_counter() - started)
+
+
+def approximate_matching(num_vertices, edges, epsilon=None, time_budget=None, initial=None):
+    result = None
+    for result in anytime_matching(num_vertices, edges, epsilon, time_budget, initial):
+        pass
+    return result
+
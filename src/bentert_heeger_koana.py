@@ -1,66 +1,70 @@
 import numpy as np
 from random import randint
 from itertools import combinations
-import networkx as nx
+from bit_adjacency import BitAdjacency
+from graph_utils import connected_components, induced_edges
+from modular_matrix import maximum_rank_vertices
+from low_rank_update import LazyElimination
+from skew_factorization import skew_inverse
+from edmonds_blossom import find_augmenting_path
+from harvey import TutteMatrix as HarveyTutteMatrix
 
 class Graph:
     def __init__(self, n):
         self.num_vertices = n
-        self.matrix = [[0] * n for _ in range(n)]
+        self.adjacency = BitAdjacency(n)
 
     def add_edge(self, i, j):
-        self.matrix[i][j] = 1
-        self.matrix[j][i] = 1
+        self.adjacency.add_edge(i, j)
+
+    def add_edges(self, edges):
+        self.adjacency.add_edges(edges)
 
     def remove_edge(self, i, j):
-        self.matrix[i][j] = 0
-        self.matrix[j][i] = 0
+        self.adjacency.remove_edge(i, j)
 
     def get_neighbors(self, v):
-        return [i for i in range(self.num_vertices) if self.matrix[v][i] == 1]
+        return self.adjacency.neighbors(v).tolist()
 
     def get_subgraph(self, vertices):
         subgraph = Graph(len(vertices))
+        subgraph.adjacency = self.adjacency.subgraph(vertices)
         index_map = {v: i for i, v in enumerate(vertices)}
-        for i in range(len(vertices)):
-            for j in range(len(vertices)):
-                if self.matrix[vertices[i]][vertices[j]] == 1:
-                    subgraph.add_edge(i, j)
         return subgraph, index_map
 
+    def get_edges(self):
+        return self.adjacency.edges()
+
     def to_networkx(self):
+        import networkx as nx
         g = nx.Graph()
-        for i in range(self.num_vertices):
-            for j in range(i + 1, self.num_vertices):
-                if self.matrix[i][j] == 1:
-                    g.add_edge(i, j)
+        g.add_edges_from(self.get_edges().tolist())
         return g
 
 class TutteMatrix:
+    # Entries of the inverse count as nonzero relative to its largest entry.
+    TOLERANCE = HarveyTutteMatrix.TOLERANCE
+
     def __init__(self, graph):
         self.graph = graph
         self.size = graph.num_vertices
+        self.edges = graph.get_edges()
         self.matrix = self.construct_tutte_matrix()
         self.inverse = None
+        self.scale = 1.0
 
     def construct_tutte_matrix(self):
         matrix = np.zeros((self.size, self.size), dtype=int)
-        for i in range(self.size):
-            for j in range(i + 1, self.size):
-                if self.graph.matrix[i][j] != 0:
-                    sign = 1 if i < j else -1
-                    matrix[i][j] = sign * (self.size * i + j)
-                    matrix[j][i] = -matrix[i][j]
+        rows, cols = self.edges[:, 0], self.edges[:, 1]
+        matrix[rows, cols] = self.size * rows + cols
+        matrix[cols, rows] = -matrix[rows, cols]
         return matrix
 
     def instantiate(self):
         instantiated_matrix = np.zeros((self.size, self.size), dtype=float)
-        for i in range(self.size):
-            for j in range(self.size):
-                if self.matrix[i][j] != 0:
-                    instantiated_matrix[i][j] = randint(1, self.size ** 2)
-                else:
-                    instantiated_matrix[i][j] = 0
+        rows, cols = self.edges[:, 0], self.edges[:, 1]
+        instantiated_matrix[rows, cols] = [randint(1, self.size ** 2) for _ in range(len(self.edges))]
+        instantiated_matrix[cols, rows] = -instantiated_matrix[rows, cols]
         return instantiated_matrix
 
     def compute_inverse(self):
@@ -68,7 +72,9 @@ class TutteMatrix:
         for attempt in range(retry_limit):
             try:
                 instantiated_matrix = self.instantiate()
-                self.inverse = np.linalg.inv(instantiated_matrix)
+                self.inverse = skew_inverse(instantiated_matrix)
+                if self.size:
+                    self.scale = float(np.abs(self.inverse).max())
                 print(f"Inverse computed on attempt {attempt + 1}")
                 return self.inverse
             except np.linalg.LinAlgError:
@@ -76,17 +82,13 @@ class TutteMatrix:
                 continue
         raise np.linalg.LinAlgError("Unable to compute non-singular inverse after several attempts")
 
-    def update_inverse(self, delta, subset):
-        U = delta[:, subset]
-        V = delta[subset, :]
-        C = self.inverse[subset, :]
-        D = self.inverse[:, subset]
-        I = np.eye(len(subset))
+    def nonzero(self, value):
+        return abs(value) > self.TOLERANCE * self.scale
 
-        if np.linalg.det(I + np.dot(np.dot(V, self.inverse), U)) != 0:
-            self.inverse -= np.dot(np.dot(self.inverse, U), np.linalg.inv(I + np.dot(np.dot(V, self.inverse), U))) @ np.dot(V, self.inverse)
-        else:
-            raise np.linalg.LinAlgError("Update resulted in singular matrix")
+def augment(mate, path):
+    for u, v in zip(path[0::2], path[1::2]):
+        mate[u] = v
+        mate[v] = u
 
 class MatchingAlgorithm:
     def __init__(self, graph):
@@ -98,15 +100,22 @@ class MatchingAlgorithm:
         while self.k <= self.graph.num_vertices:
             try:
                 S, C_components = self.find_k_separator(self.k)
-                T = TutteMatrix(self.graph).construct_tutte_matrix()
 
+                short = []
                 for C in C_components:
+                    C = self.maximum_rank_subset(C)
+                    if not C:
+                        continue
                     subgraph, index_map = self.graph.get_subgraph(C)
                     tutte_matrix = TutteMatrix(subgraph)
                     tutte_matrix.compute_inverse()
 
+                    before = len(self.matching)
                     self.combine_allowed_edges(tutte_matrix, C, index_map)
+                    if len(self.matching) - before < len(C) // 2:
+                        short.extend(C)
 
+                self.add_separator_vertices(S, short)
                 return self.matching
 
             except (ValueError, np.linalg.LinAlgError) as e:
@@ -116,29 +125,65 @@ class MatchingAlgorithm:
         raise ValueError("No valid k-separator found for any k up to the number of vertices")
 
     def find_k_separator(self, k):
-        g = self.graph.to_networkx()
+        n = self.graph.num_vertices
+        edges = self.graph.get_edges()
+        has_edges = np.bincount(edges.ravel(), minlength=n) > 0
         for size in range(1, k + 1):
-            for S in combinations(range(self.graph.num_vertices), size):
-                remaining_vertices = set(range(self.graph.num_vertices)) - set(S)
-                subgraph = g.subgraph(remaining_vertices)
-                components = list(nx.connected_components(subgraph))
+            for S in combinations(range(n), size):
+                keep = has_edges.copy()
+                keep[list(S)] = False
+                remaining_vertices = np.flatnonzero(keep)
+                subgraph_edges = induced_edges(edges, remaining_vertices, n)
+                components = [remaining_vertices[comp] for comp in connected_components(len(remaining_vertices), subgraph_edges)]
                 if all(len(comp) <= k - len(S) for comp in components):
-                    return list(S), [list(comp) for comp in components]
+                    return list(S), [comp.tolist() for comp in components]
         raise ValueError("No valid k-separator found")
 
+    def maximum_rank_subset(self, C):
+        subgraph, _ = self.graph.get_subgraph(C)
+        vertices = maximum_rank_vertices(len(C), subgraph.get_edges())
+        return [C[v] for v in vertices]
+
     def combine_allowed_edges(self, tutte_matrix, C, index_map):
-        for i in range(len(C)):
-            for j in range(i + 1, len(C)):
-                if tutte_matrix.matrix[i][j] != 0 and round(tutte_matrix.inverse[i][j], 10) != 0:
-                    if not self.is_in_matching(C[i]) and not self.is_in_matching(C[j]):
-                        self.matching.append((C[i], C[j]))
-                        delta = np.zeros_like(tutte_matrix.matrix)
-                        delta[i, j] = delta[j, i] = tutte_matrix.matrix[i][j]
-                        tutte_matrix.matrix[i][j] = tutte_matrix.matrix[j][i] = 0
-                        try:
-                            tutte_matrix.update_inverse(delta, [i, j])
-                        except np.linalg.LinAlgError:
-                            print(f"Failed to update inverse for edge ({C[i]}, {C[j]})")
+        # Matched pairs are eliminated in batches; entries in between are read
+        # through the pending eliminations.
+        eliminations = LazyElimination(tutte_matrix.inverse, skew=True)
+        for i, j in tutte_matrix.edges.tolist():
+            if tutte_matrix.nonzero(float(eliminations.read([i], [j])[0, 0])):
+                if not self.is_in_matching(C[i]) and not self.is_in_matching(C[j]):
+                    self.matching.append((C[i], C[j]))
+                    try:
+                        eliminations.add([i, j])
+                    except np.linalg.LinAlgError:
+                        print(f"Failed to update inverse for edge ({C[i]}, {C[j]})")
+
+    def add_separator_vertices(self, S, short=()):
+        # The matching is maximum in G - S. With the separator vertices added
+        # one at a time, an augmenting path in G - S + {s_1, ..., s_i} has to
+        # end at s_i, so a single search from s_i keeps the matching maximum
+        # and |S| searches finish it. Components whose algebraic matching fell
+        # short are completed first by searches from their exposed vertices.
+        outside = set(S)
+        adjacency = {}
+        for u, v in self.graph.get_edges().tolist():
+            if u not in outside and v not in outside:
+                adjacency.setdefault(u, set()).add(v)
+                adjacency.setdefault(v, set()).add(u)
+        mate = {}
+        for u, v in self.matching:
+            mate[u] = v
+            mate[v] = u
+        for root in short:
+            if root not in mate:
+                augment(mate, find_augmenting_path(adjacency, mate, root))
+        for s in S:
+            outside.discard(s)
+            for v in self.graph.get_neighbors(s):
+                if v not in outside:
+                    adjacency.setdefault(s, set()).add(v)
+                    adjacency.setdefault(v, set()).add(s)
+            augment(mate, find_augmenting_path(adjacency, mate, s))
+        self.matching = [(u, v) for u, v in mate.items() if u < v]
 
     def is_in_matching(self, vertex):
         for u, v in self.matching:
@@ -146,6 +191,11 @@ class MatchingAlgorithm:
                 return True
         return False
 
+def solve(num_vertices, edges):
+    graph = Graph(num_vertices)
+    graph.add_edges(edges)
+    return MatchingAlgorithm(graph).find_maximum_matching()
+
 def main():
     g = Graph(10)
     edges = [
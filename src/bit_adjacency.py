@@ -0,0 +1,106 @@
+import numpy as np
+
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+# Rows are unpacked at most this many bytes at a time.
+UNPACK_BYTES = 1 << 24
+
+
+class BitAdjacency:
+    # One bit per vertex pair. Row i is the neighbourhood of i in np.packbits
+    # order, padded to whole 64-bit words so that neighbourhoods can be
+    # intersected a word at a time.
+    def __init__(self, num_vertices):
+        self.num_vertices = num_vertices
+        self.row_bytes = 8 * ((num_vertices + 63) // 64)
+        self.bits = np.zeros((num_vertices, self.row_bytes), dtype=np.uint8)
+
+    @classmethod
+    def from_edges(cls, num_vertices, edges):
+        adjacency = cls(num_vertices)
+        adjacency.add_edges(edges)
+        return adjacency
+
+    def positions(self, rows, cols):
+        cols = np.asarray(cols, dtype=np.int64)
+        return (np.asarray(rows, dtype=np.int64), cols >> 3), (128 >> (cols & 7)).astype(np.uint8)
+
+    def add_edges(self, edges):
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        index, bit = self.positions(np.concatenate([edges[:, 0], edges[:, 1]]), np.concatenate([edges[:, 1], edges[:, 0]]))
+        np.bitwise_or.at(self.bits, index, bit)
+
+    def add_edge(self, i, j):
+        self.add_edges([(i, j)])
+
+    def remove_edge(self, i, j):
+        index, bit = self.positions([i, j], [j, i])
+        self.bits[index] &= ~bit
+
+    def has_edge(self, i, j):
+        return bool(self.bits[i, j >> 3] & (128 >> (j & 7)))
+
+    def has_edges(self, rows, cols):
+        index, bit = self.positions(rows, cols)
+        return (self.bits[index] & bit) != 0
+
+    def words(self, rows=slice(None)):
+        return self.bits[rows].view(np.uint64)
+
+    def pack(self, vertices):
+        # A vertex set as a row mask, for intersecting with neighbourhoods.
+        mask = np.zeros(self.row_bytes * 8, dtype=bool)
+        mask[vertices] = True
+        return np.packbits(mask)
+
+    def discard(self, mask, vertices):
+        vertices = np.asarray(vertices, dtype=np.int64)
+        np.bitwise_and.at(mask, vertices >> 3, ~(128 >> (vertices & 7)).astype(np.uint8))
+
+    def row(self, i):
+        return np.unpackbits(self.bits[i], count=self.num_vertices).astype(bool)
+
+    def neighbors(self, i, within=None):
+        bits = self.bits[i] if within is None else self.bits[i] & within
+        return np.flatnonzero(np.unpackbits(bits, count=self.num_vertices))
+
+    def degrees(self, within=None):
+        bits = self.bits if within is None else self.bits & within
+        return POPCOUNT[bits].sum(axis=1, dtype=np.int64)
+
+    def common_neighbors(self, rows, cols):
+        # |N(u) & N(v)| for each pair, one AND per 64-bit word.
+        shared = (self.words(rows) & self.words(cols)).view(np.uint8)
+        return POPCOUNT[shared].sum(axis=-1, dtype=np.int64)
+
+    def chunks(self, vertices):
+        step = max(1, UNPACK_BYTES // max(self.num_vertices, 1))
+        for start in range(0, len(vertices), step):
+            rows = vertices[start:start + step]
+            yield rows, np.unpackbits(self.bits[rows], axis=1, count=self.num_vertices).astype(bool)
+
+    def subgraph(self, vertices):
+        vertices = np.asarray(vertices, dtype=np.int64)
+        subgraph = BitAdjacency(len(vertices))
+        position = 0
+        for rows, dense in self.chunks(vertices):
+            block = np.zeros((len(rows), subgraph.row_bytes * 8), dtype=bool)
+            block[:, :len(vertices)] = dense[:, vertices]
+            subgraph.bits[position:position + len(rows)] = np.packbits(block, axis=1)
+            position += len(rows)
+        return subgraph
+
+    def edges(self):
+        found = []
+        for rows, dense in self.chunks(np.arange(self.num_vertices)):
+            dense &= np.arange(self.num_vertices)[None, :] > rows[:, None]
+            local, cols = np.nonzero(dense)
+            found.append(np.column_stack([rows[local], cols]))
+        return np.concatenate(found) if found else np.empty((0, 2), dtype=np.int64)
+
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def __array__(self, dtype=None, copy=None):
+        dense = np.unpackbits(self.bits, axis=1, count=self.num_vertices)
+        return dense if dtype is None else dense.astype(dtype)
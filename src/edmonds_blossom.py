@@ -1,3 +1,6 @@
+from collections import deque
+
+
 class Graph:
     def __init__(self):
         self.adjacency = {}
@@ -30,14 +33,14 @@ class Graph:
     def contract(self, blossom):
         new_graph = Graph()
         new_vertex = blossom.id
+        inside = set(blossom.vertices)
         new_graph.adjacency[new_vertex] = set()
-        for v in blossom.vertices:
-            for u in self.adjacency[v]:
-                if u not in blossom.vertices:
-                    new_graph.add_edge(new_vertex, u)
-        for v in self.adjacency:
-            if v not in blossom.vertices:
-                new_graph.adjacency[v] = set(self.adjacency[v])
+        for v, neighbors in self.adjacency.items():
+            if v in inside:
+                continue
+            new_graph.adjacency[v] = {new_vertex if u in inside else u for u in neighbors}
+            if new_vertex in new_graph.adjacency[v]:
+                new_graph.adjacency[new_vertex].add(v)
         new_graph.unmark_all_edges()
         return new_graph
     
@@ -48,30 +51,24 @@ class Graph:
             raise ValueError("A path cannot contain exactly one vertex")
 
         def find_path_through_blossom(endpoint):
-            for direction in [blossom.traverse_left, blossom.traverse_right]:
-                blossom_path = list(direction())
-                for i, v in enumerate(blossom_path):
-                    if endpoint in self.adjacency[v]:
-                        if i % 2 == 0:
-                            return blossom_path[:i + 1]
-                        else:
-                            return list(reversed(blossom_path[:i + 1]))
+            # The cycle starts at the base and its matched edges are (c1, c2),
+            # (c3, c4), ..., so from any c_j one direction reaches the base
+            # along an even alternating path that starts with a matched edge.
+            cycle = list(blossom.traverse_from_base())
+            for j, v in enumerate(cycle):
+                if endpoint in self.adjacency[v]:
+                    return cycle[j:] + cycle[:1] if j % 2 else cycle[j::-1]
             raise ValueError("A valid path through the blossom was not found")
 
-        expanded_path = []
-        for i, v in enumerate(path):
-            if v == blossom.id:
-                if i == 0:
-                    expanded_path.extend(find_path_through_blossom(path[i + 1]))
-                elif i == len(path) - 1:
-                    expanded_path.extend(reversed(find_path_through_blossom(path[i - 1])))
-                else:
-                    expanded_path.extend(reversed(find_path_through_blossom(path[i - 1])))
-                    expanded_path.pop()
-                    expanded_path.extend(find_path_through_blossom(path[i + 1]))
-            else:
-                expanded_path.append(v)
-        return expanded_path
+        if blossom.id not in path:
+            return path
+        i = path.index(blossom.id)
+        # Path edges (p0, p1), (p2, p3), ... are unmatched, so the blossom
+        # meets the unmatched path edge on its right when i is even and on
+        # its left when i is odd; the other side is the base's matched edge.
+        if i % 2 == 0:
+            return path[:i] + find_path_through_blossom(path[i + 1])[::-1] + path[i + 1:]
+        return path[:i] + find_path_through_blossom(path[i - 1]) + path[i + 1:]
 
 
 class Matching:
@@ -95,11 +92,35 @@ class Matching:
         self.edges.add((u, v))
         self.exposed_vertices.discard(u)
         self.exposed_vertices.discard(v)
-    
+
+    def remove_edge(self, u, v):
+        self.adjacency[u].discard(v)
+        self.adjacency[v].discard(u)
+        self.edges.discard((u, v))
+        self.edges.discard((v, u))
+        self.exposed_vertices.add(u)
+        self.exposed_vertices.add(v)
+
     def augment(self, path):
+        for i in range(1, len(path) - 1, 2):
+            self.remove_edge(path[i], path[i + 1])
         for i in range(0, len(path) - 1, 2):
             self.add_edge(path[i], path[i + 1])
         return self
+
+    def contract(self, blossom):
+        # Only the base can be matched outside the blossom, so its edge
+        # becomes the blossom vertex's and the rest stay inside.
+        inside = set(blossom.vertices)
+        contracted = Matching()
+        contracted.add_vertex(blossom.id)
+        for v in self.adjacency:
+            if v not in inside:
+                contracted.add_vertex(v)
+        for u, v in self.edges:
+            if u not in inside or v not in inside:
+                contracted.add_edge(blossom.id if u in inside else u, blossom.id if v in inside else v)
+        return contracted
     
     def get_edges(self):
         return self.edges
@@ -126,6 +147,11 @@ class Blossom:
     def traverse_right(self):
         yield from reversed(self.vertices)
 
+    def traverse_from_base(self):
+        start = self.vertices.index(self.base)
+        yield from self.vertices[start:]
+        yield from self.vertices[:start]
+
 
 class Forest:
     def __init__(self):
@@ -206,7 +232,7 @@ def get_augmenting_path(graph, matching):
             else:
                 if forest.get_distance_to_root(w) % 2 == 0:
                     if forest.get_root(v) != forest.get_root(w):
-                        return forest.get_path_from_root_to(v) + forest.get_path_from_root_to(w)[::-1]
+                        return forest.get_path_from_root_to(v)[::-1] + forest.get_path_from_root_to(w)
                     else:
                         blossom = forest.get_blossom(v, w)
                         graph_prime = graph.contract(blossom)
@@ -222,11 +248,109 @@ def get_augmenting_path(graph, matching):
 
 def get_maximum_matching(graph, matching):
     augmenting_path = get_augmenting_path(graph, matching)
-    if augmenting_path:
+    while augmenting_path:
         matching.augment(augmenting_path)
-        return get_maximum_matching(graph, matching)
+        augmenting_path = get_augmenting_path(graph, matching)
+    return matching
+
+
+def find_augmenting_path(adjacency, mate, root):
+    # Breadth-first search from one exposed vertex. Blossoms are shrunk in
+    # place by pointing their vertices at a common base instead of building a
+    # contracted copy of the graph, and parent links inside a blossom are
+    # rewired so that every even vertex still has an alternating path back to
+    # the root.
+    base = {}
+    parent = {}
+    reached = [root]
+    even = {root}
+    queue = deque([root])
+
+    def base_of(v):
+        return base.get(v, v)
+
+    def common_base(a, b):
+        seen = set()
+        while True:
+            a = base_of(a)
+            seen.add(a)
+            if a not in mate:
+                break
+            a = parent[mate[a]]
+        while base_of(b) not in seen:
+            b = parent[mate[base_of(b)]]
+        return base_of(b)
+
+    def mark_path(v, b, child, blossom):
+        while base_of(v) != b:
+            blossom.add(base_of(v))
+            blossom.add(base_of(mate[v]))
+            parent[v] = child
+            child = mate[v]
+            v = parent[mate[v]]
+
+    while queue:
+        v = queue.popleft()
+        for w in adjacency.get(v, ()):
+            if base_of(v) == base_of(w) or mate.get(v) == w:
+                continue
+            if w == root or (w in mate and mate[w] in parent):
+                b = common_base(v, w)
+                blossom = set()
+                mark_path(v, b, w, blossom)
+                mark_path(w, b, v, blossom)
+                for x in reached:
+                    if base_of(x) in blossom:
+                        base[x] = b
+                        if x not in even:
+                            even.add(x)
+                            queue.append(x)
+            elif w not in parent:
+                parent[w] = v
+                reached.append(w)
+                if w not in mate:
+                    path = [w]
+                    while path[-1] != root:
+                        path.append(parent[path[-1]])
+                        if path[-1] != root:
+                            path.append(mate[path[-1]])
+                    return path[::-1]
+                x = mate[w]
+                reached.append(x)
+                even.add(x)
+                queue.append(x)
+    return []
+
+
+def complete_matching(graph, matching):
+    # One search per exposed vertex suffices: a vertex with no augmenting path
+    # has none after augmentations elsewhere either. A matching seeded close
+    # to maximum therefore costs a search per remaining exposed vertex.
+    mate = {}
+    for u, v in matching.get_edges():
+        mate[u] = v
+        mate[v] = u
+    for root in sorted(matching.get_exposed_vertices()):
+        if root in mate:
+            continue
+        path = find_augmenting_path(graph.adjacency, mate, root)
+        if path:
+            matching.augment(path)
+            for u, v in zip(path[0::2], path[1::2]):
+                mate[u] = v
+                mate[v] = u
     return matching
 
+
+def solve(num_vertices, edges):
+    graph = Graph()
+    matching = Matching()
+    for v in range(num_vertices):
+        matching.add_vertex(v)
+    for u, v in edges:
+        graph.add_edge(u, v)
+    return list(get_maximum_matching(graph, matching).get_edges())
+
 def test_case_1():
     graph = Graph()
     graph.add_edge(1, 2)
@@ -312,8 +436,12 @@ def test_case_4():
     print("Edges in maximum matching:", maximum_matching.get_edges())
     print("\n")
 
-print("\n")
-test_case_1()
-test_case_2()
-test_case_3()
-test_case_4()
\ No newline at end of file
+def main():
+    print("\n")
+    test_case_1()
+    test_case_2()
+    test_case_3()
+    test_case_4()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
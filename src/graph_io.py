@@ -0,0 +1,73 @@
+import ast
+import csv
+import numpy as np
+from graph_utils import connected_components
+
+
+class EdgeGraph:
+    # Transaction files put users and products in one label space, product p
+    # at label product_offset + p; for other files product_offset is None.
+    def __init__(self, num_vertices, edges, labels=None, product_offset=None):
+        self.num_vertices = num_vertices
+        self.edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.labels = np.arange(num_vertices) if labels is None else np.asarray(labels)
+        self.product_offset = product_offset
+
+    @classmethod
+    def from_labelled_edges(cls, pairs, product_offset=None):
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        labels, compact = np.unique(pairs, return_inverse=True)
+        edges = np.sort(compact.reshape(-1, 2), axis=1)
+        edges = np.unique(edges[edges[:, 0] != edges[:, 1]], axis=0)
+        return cls(len(labels), edges, labels, product_offset)
+
+    def components(self):
+        return connected_components(self.num_vertices, self.edges)
+
+    def original_pairs(self, pairs):
+        # Matched pairs in the ids of the input file: (user_id, product_id)
+        # for transaction files, where users sort before every product.
+        labelled = self.labels[np.asarray(pairs, dtype=np.int64).reshape(-1, 2)]
+        if self.product_offset is not None:
+            labelled = np.sort(labelled, axis=1)
+            labelled[:, 1] -= self.product_offset
+        return labelled
+
+
+def read_csv_rows(path):
+    with open(path, newline="") as handle:
+        reader = csv.reader(handle)
+        header = next(reader)
+        return header, list(reader)
+
+
+def load_csv(path):
+    header, rows = read_csv_rows(path)
+    if "edges" in header:
+        column = header.index("edges")
+        pairs = [pair for row in rows for pair in ast.literal_eval(row[column])]
+        return EdgeGraph.from_labelled_edges(pairs)
+    if "user_id" in header and "product_id" in header:
+        users = np.array([int(row[header.index("user_id")]) for row in rows])
+        products = np.array([int(row[header.index("product_id")]) for row in rows])
+        # Users and products share one vertex space, products after all users.
+        offset = int(users.max()) + 1
+        return EdgeGraph.from_labelled_edges(np.column_stack([users, products + offset]), offset)
+    return EdgeGraph.from_labelled_edges([(int(row[0]), int(row[1])) for row in rows])
+
+
+def load_cache(path):
+    with np.load(path) as data:
+        offset = int(data["product_offset"]) if "product_offset" in data else -1
+        return EdgeGraph(int(data["num_vertices"]), data["edges"], data["labels"], offset if offset >= 0 else None)
+
+
+def save_cache(path, graph):
+    offset = -1 if graph.product_offset is None else graph.product_offset
+    np.savez_compressed(path, num_vertices=graph.num_vertices, edges=graph.edges, labels=graph.labels, product_offset=offset)
+
+
+def load_graph(path):
+    if str(path).endswith(".npz"):
+        return load_cache(path)
+    return load_csv(path)
@@ -0,0 +1,96 @@
+import numpy as np
+
+
+def to_csr(num_vertices, edges):
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    sources = np.concatenate([edges[:, 0], edges[:, 1]])
+    targets = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_vertices), out=indptr[1:])
+    return indptr, targets[order]
+
+
+def neighbors_of(indptr, indices, frontier):
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = counts.sum()
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return indices[offsets + np.arange(total)]
+
+
+def bfs_levels(num_vertices, edges, csr=None):
+    indptr, indices = to_csr(num_vertices, edges) if csr is None else csr
+    levels = np.full(num_vertices, -1, dtype=np.int64)
+    labels = np.full(num_vertices, -1, dtype=np.int64)
+    count = 0
+    for start in range(num_vertices):
+        if labels[start] != -1:
+            continue
+        frontier = np.array([start])
+        levels[start] = 0
+        labels[start] = count
+        depth = 0
+        while len(frontier):
+            depth += 1
+            reached = np.unique(neighbors_of(indptr, indices, frontier))
+            frontier = reached[labels[reached] == -1]
+            levels[frontier] = depth
+            labels[frontier] = count
+        count += 1
+    return levels, labels, count
+
+
+def core_numbers(num_vertices, indptr, indices):
+    # Bucket peeling: repeatedly remove a vertex of least remaining degree.
+    # Its core number is the largest such degree seen up to its removal. A
+    # repeated edge lowers a neighbour's degree more than once, so the lowest
+    # bucket is tracked through every decrement rather than stepped down once.
+    degrees = np.diff(indptr).astype(np.int64)
+    buckets = [set() for _ in range(int(degrees.max()) + 1 if num_vertices else 1)]
+    for v in range(num_vertices):
+        buckets[degrees[v]].add(v)
+    removed = np.zeros(num_vertices, dtype=bool)
+    core = np.zeros(num_vertices, dtype=np.int64)
+    result = 0
+    low = 0
+    for _ in range(num_vertices):
+        while not buckets[low]:
+            low += 1
+        v = buckets[low].pop()
+        result = max(result, low)
+        core[v] = result
+        removed[v] = True
+        for u in indices[indptr[v]:indptr[v + 1]]:
+            if not removed[u]:
+                buckets[degrees[u]].discard(u)
+                degrees[u] -= 1
+                buckets[degrees[u]].add(u)
+                low = min(low, degrees[u])
+    return core
+
+
+def connected_components(num_vertices, edges):
+    _, labels, count = bfs_levels(num_vertices, edges)
+    if count == 0:
+        return []
+    order = np.argsort(labels, kind="stable")
+    splits = np.cumsum(np.bincount(labels, minlength=count))[:-1]
+    return np.split(order, splits)
+
+
+def is_bipartite(num_vertices, edges):
+    levels, _, _ = bfs_levels(num_vertices, edges)
+    colors = levels % 2
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    return bool(np.all(colors[edges[:, 0]] != colors[edges[:, 1]])), colors
+
+
+def induced_edges(edges, vertices, num_vertices):
+    index = np.full(num_vertices, -1, dtype=np.int64)
+    index[vertices] = np.arange(len(vertices))
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    local = index[edges]
+    return local[(local[:, 0] >= 0) & (local[:, 1] >= 0)]
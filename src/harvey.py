@@ -1,5 +1,13 @@
+import warnings
 import numpy as np
 from random import randint
+from tiled_matrix import TiledMatrix
+from bit_adjacency import BitAdjacency
+from modular_matrix import DEFAULT_PRIME, maximum_rank_vertices
+from skew_factorization import skew_inverse
+from graph_utils import induced_edges
+from sparse_lu import sparse_maximum_rank_vertices
+from low_rank_update import LazyElimination, skew_entries
 
 class Graph:
     EDGE_EXISTS = 1
@@ -7,59 +15,96 @@ class Graph:
 
     def __init__(self, n):
         self.num_vertices = n
-        self.matrix = [[0] * n for _ in range(n)]
+        self.adjacency = BitAdjacency(n)
 
     def add_edge(self, i, j):
-        self.matrix[i][j] = self.EDGE_EXISTS
-        self.matrix[j][i] = self.EDGE_EXISTS
+        self.adjacency.add_edge(i, j)
+
+    def add_edges(self, edges):
+        self.adjacency.add_edges(edges)
 
     def get_val(self, i, j):
-        return "x" if self.matrix[i][j] == self.EDGE_EXISTS else "o"
+        return "x" if self.adjacency.has_edge(i, j) else "o"
 
     def print_graph(self):
         print("  ", end=' ')
-        for i in range(len(self.matrix)):
+        for i in range(self.num_vertices):
             print(str(i).center(len(self.get_val(i, i))), end=' ')
         print()
-        for i in range(len(self.matrix)):
+        for i in range(self.num_vertices):
             print(i, end=' ')
-            for j in range(len(self.matrix)):
+            for j in range(self.num_vertices):
                 print(self.get_val(i, j), end=' ')
             print()
 
 class TutteMatrix:
-    def __init__(self, graph):
+    OUT_OF_CORE_THRESHOLD = 4096
+    # Relative to the largest entry of the first inverse; eliminations drift
+    # far enough that a fixed number of decimals misreads rounding noise.
+    TOLERANCE = 1e-7
+
+    def __init__(self, graph, out_of_core_threshold=None, tile_size=TiledMatrix.DEFAULT_TILE_SIZE, prime=None):
         self.graph = graph
         self.size = graph.num_vertices
-        self.matrix = self.construct_tutte_matrix()
+        self.prime = prime
+        threshold = self.OUT_OF_CORE_THRESHOLD if out_of_core_threshold is None else out_of_core_threshold
+        self.out_of_core = self.size > threshold
+        self.tile_size = tile_size
+        self.edges = graph.adjacency.edges()
+        # The symbolic matrix is only for inspection, so it is built on first use.
+        self._matrix = None
         self.inverse = None
+        self.scale = 1.0
+
+    @property
+    def matrix(self):
+        if self._matrix is None and not self.out_of_core:
+            self._matrix = self.construct_tutte_matrix()
+        return self._matrix
 
     def construct_tutte_matrix(self):
         matrix = np.zeros((self.size, self.size), dtype=float)
-        for i in range(self.size):
-            for j in range(i + 1, self.size):
-                if self.graph.matrix[i][j] != 0:
-                    sign = 1 if i < j else -1
-                    matrix[i][j] = sign * (self.size * i + j)
-                    matrix[j][i] = -matrix[i][j]
+        rows, cols = self.edges[:, 0], self.edges[:, 1]
+        matrix[rows, cols] = self.size * rows + cols
+        matrix[cols, rows] = -matrix[rows, cols]
         return matrix
 
     def instantiate(self):
-        instantiated_matrix = np.zeros((self.size, self.size), dtype=float)
-        for i in range(self.size):
-            for j in range(self.size):
-                if self.matrix[i][j] != 0:
-                    instantiated_matrix[i][j] = randint(1, self.size ** 2)
-                else:
-                    instantiated_matrix[i][j] = 0
+        if self.out_of_core:
+            return self.instantiate_tiled()
+        if self.prime is None:
+            instantiated_matrix = np.zeros((self.size, self.size), dtype=float)
+            high = self.size ** 2
+        else:
+            instantiated_matrix = np.zeros((self.size, self.size), dtype=np.int64)
+            high = self.prime - 1
+        # Skew-symmetric, so the matrix is nonsingular exactly when the graph
+        # has a perfect matching.
+        rows, cols = self.edges[:, 0], self.edges[:, 1]
+        values = self.random_values(high)
+        instantiated_matrix[rows, cols] = values
+        instantiated_matrix[cols, rows] = -values if self.prime is None else self.prime - values
         return instantiated_matrix
 
+    def random_values(self, high):
+        return np.array([randint(1, high) for _ in range(len(self.edges))], dtype=np.int64)
+
+    def instantiate_tiled(self):
+        high = self.size ** 2 if self.prime is None else self.prime - 1
+        rows, cols, values = skew_entries(self.edges, self.random_values(high), self.prime)
+        return TiledMatrix.from_entries(self.size, rows, cols, values, self.tile_size, prime=self.prime)
+
     def compute_inverse(self):
         retry_limit = 10
         for attempt in range(retry_limit):
             try:
                 instantiated_matrix = self.instantiate()
-                self.inverse = np.linalg.inv(instantiated_matrix)
+                if self.out_of_core:
+                    self.inverse = instantiated_matrix.invert()
+                else:
+                    self.inverse = skew_inverse(instantiated_matrix, self.prime)
+                if self.prime is None and self.size:
+                    self.scale = self.inverse.abs_max() if self.out_of_core else float(np.abs(self.inverse).max())
                 print(f"Inverse computed on attempt {attempt + 1}")
                 return self.inverse
             except np.linalg.LinAlgError:
@@ -67,27 +112,61 @@ class TutteMatrix:
                 continue
         raise np.linalg.LinAlgError("Unable to compute non-singular inverse after several attempts")
 
-    def update_inverse(self, delta, subset):
-        U = delta[:, subset]
-        V = delta[subset, :]
-        C = self.inverse[subset, :]
-        D = self.inverse[:, subset]
-        I = np.eye(len(subset))
-
-        if np.linalg.det(I + np.dot(np.dot(V, self.inverse), U)) != 0:
-            self.inverse -= np.dot(np.dot(self.inverse, U), np.linalg.inv(I + np.dot(np.dot(V, self.inverse), U))) @ np.dot(V, self.inverse)
-        else:
-            raise np.linalg.LinAlgError("Update resulted in singular matrix")
+    def nonzero(self, values):
+        if self.prime is not None:
+            return np.asarray(values) != 0
+        return np.abs(values) > self.TOLERANCE * self.scale
 
 class HarveyAlgorithm:
-    def __init__(self, graph):
+    def __init__(self, graph, out_of_core_threshold=None, prime=None):
         self.graph = graph
-        self.tutte_matrix = TutteMatrix(graph)
+        self.tutte_matrix = TutteMatrix(graph, out_of_core_threshold, prime=prime)
+        self.out_of_core_threshold = out_of_core_threshold
+        self.prime = prime
         self.matching = []
+        self.eliminations = None
+        self.matched = np.zeros(graph.num_vertices, dtype=bool)
+        self.free = graph.adjacency.pack(np.arange(graph.num_vertices))
+
+    def construct_maximum_matching(self):
+        n = self.graph.num_vertices
+        edges = self.graph.adjacency.edges()
+        if self.tutte_matrix.out_of_core:
+            # The dense rank profile holds several n x n arrays; the sparse
+            # elimination only holds its fill.
+            vertices = sparse_maximum_rank_vertices(n, edges)
+        else:
+            vertices = maximum_rank_vertices(n, edges, DEFAULT_PRIME if self.prime is None else self.prime)
+        if len(vertices) == 0:
+            return self.matching
+        try:
+            pairs = self.match_subgraph(vertices, edges, self.prime)
+        except np.linalg.LinAlgError:
+            pairs = []
+        # The rank gives the target size, so a floating-point run that lost
+        # an allowed edge to rounding is detected and redone exactly, in core
+        # or on GF(p) tiles.
+        if len(pairs) < len(vertices) // 2 and self.prime is None:
+            print("Floating-point matching fell short, retrying over GF(p)")
+            pairs = self.match_subgraph(vertices, edges, DEFAULT_PRIME)
+        if len(pairs) < len(vertices) // 2:
+            # Over GF(p) this happens only when a random instantiation hits a
+            # zero, with probability at most n / p.
+            warnings.warn(f"Matching has {len(pairs)} edges, the rank bound is {len(vertices) // 2}")
+        for i, j in pairs:
+            self.add_matched_pair(i, j)
+        return self.matching
+
+    def match_subgraph(self, vertices, edges, prime):
+        subgraph = Graph(len(vertices))
+        subgraph.add_edges(induced_edges(edges, vertices, self.graph.num_vertices))
+        sub = HarveyAlgorithm(subgraph, self.out_of_core_threshold, prime)
+        return [(int(vertices[i]), int(vertices[j])) for i, j in sub.construct_perfect_matching()]
 
     def construct_perfect_matching(self):
-        T = self.tutte_matrix.construct_tutte_matrix()
-        self.tutte_matrix.compute_inverse()
+        # Matched pairs reach the inverse in batches, one pass over it per
+        # LazyElimination.limit matched vertices instead of one per pair.
+        self.eliminations = LazyElimination(self.tutte_matrix.compute_inverse(), self.prime, skew=True)
         S = list(range(self.graph.num_vertices))
         self.combine_allowed_edges(S)
         return self.matching
@@ -100,32 +179,41 @@ class HarveyAlgorithm:
             self.combine_allowed_edges(S1)
             self.combine_allowed_edges(S2)
 
+            in_S2 = self.graph.adjacency.pack(S2)
             for i in S1:
-                for j in S2:
-                    if self.graph.matrix[i][j] != 0 and round(self.tutte_matrix.inverse[i][j], 10) != 0:
-                        if not self.is_in_matching(i) and not self.is_in_matching(j):
-                            self.matching.append((i, j))
-                            delta = np.zeros_like(self.tutte_matrix.matrix)
-                            delta[i, j] = delta[j, i] = self.graph.matrix[i][j]
-                            self.graph.matrix[i][j] = self.graph.matrix[j][i] = 0
-                            self.tutte_matrix.update_inverse(delta, [i, j])
-                            break  
+                if not self.is_in_matching(i):
+                    partners = self.allowed_partners(i, in_S2)
+                    if len(partners):
+                        self.add_to_matching(i, int(partners[0]))
         else:
             if len(S) == 2:
                 i, j = S
-                if self.graph.matrix[i][j] != 0 and round(self.tutte_matrix.inverse[i][j], 10) != 0:
+                if self.graph.adjacency.has_edge(i, j) and self.tutte_matrix.nonzero(self.eliminations.read([i], [j])[0, 0]):
                     if not self.is_in_matching(i) and not self.is_in_matching(j):
-                        self.matching.append((i, j))
-                        delta = np.zeros_like(self.tutte_matrix.matrix)
-                        delta[i, j] = delta[j, i] = self.graph.matrix[i][j]
-                        self.graph.matrix[i][j] = self.graph.matrix[j][i] = 0
-                        self.tutte_matrix.update_inverse(delta, [i, j])
+                        self.add_to_matching(i, j)
+
+    def allowed_partners(self, i, mask):
+        # Free neighbours of i inside the mask, one AND per byte of the row.
+        cols = self.graph.adjacency.neighbors(i, mask & self.free)
+        values = self.eliminations.read([i], cols)[0]
+        return cols[self.tutte_matrix.nonzero(values)]
+
+    def add_matched_pair(self, i, j):
+        self.matching.append((i, j))
+        self.matched[[i, j]] = True
+        self.graph.adjacency.discard(self.free, [i, j])
+
+    def add_to_matching(self, i, j):
+        self.add_matched_pair(i, j)
+        self.eliminations.add([i, j])
 
     def is_in_matching(self, vertex):
-        for u, v in self.matching:
-            if u == vertex or v == vertex:
-                return True
-        return False
+        return bool(self.matched[vertex])
+
+def solve(num_vertices, edges):
+    graph = Graph(num_vertices)
+    graph.add_edges(edges)
+    return HarveyAlgorithm(graph).construct_maximum_matching()
 
 def main():
     g1 = Graph(3)
@@ -133,7 +221,7 @@ def main():
     g1.add_edge(0, 2)
     g1.add_edge(1, 2)
     harvey1 = HarveyAlgorithm(g1)
-    print("G1 perfect matching set:", harvey1.construct_perfect_matching())
+    print("G1 maximum matching set:", harvey1.construct_maximum_matching())
 
     g2 = Graph(4)
     g2.add_edge(0, 1)
@@ -141,7 +229,7 @@ def main():
     g2.add_edge(1, 2)
     g2.add_edge(2, 3)
     harvey2 = HarveyAlgorithm(g2)
-    print("G2 perfect matching set:", harvey2.construct_perfect_matching())
+    print("G2 maximum matching set:", harvey2.construct_maximum_matching())
 
     g3 = Graph(6)
     edges = [
@@ -156,7 +244,7 @@ def main():
         g3.add_edge(i, j)
 
     harvey3 = HarveyAlgorithm(g3)
-    print("G3 perfect matching set:", harvey3.construct_perfect_matching())
+    print("G3 maximum matching set:", harvey3.construct_maximum_matching())
 
 if __name__ == "__main__":
     main()
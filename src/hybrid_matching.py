@@ -0,0 +1,102 @@
+import time
+import warnings
+import numpy as np
+import edmonds_blossom
+from approximate_matching import anytime_matching
+from graph_utils import core_numbers, induced_edges, to_csr
+
+# The core handed to the algebraic engine is the largest k-core with at least
+# this edge density and at most MAX_CORE_SIZE vertices.
+CORE_DENSITY = 0.1
+MAX_CORE_SIZE = 2048
+# Augmenting paths of up to 2k - 1 edges are found by the cheap bounded search
+# before the blossom search, with k / (k + 1) >= 1 - SHORT_PATH_EPSILON.
+SHORT_PATH_EPSILON = 0.2
+
+
+class HybridResult:
+    def __init__(self, matching, core_size, sizes, timings):
+        self.matching = matching
+        self.core_size = core_size
+        # Matching size after the core engine, the greedy pass, the short
+        # augmenting paths and the blossom search.
+        self.sizes = sizes
+        self.timings = timings
+
+    def __repr__(self):
+        stages = ", ".join(f"{stage}={size}" for stage, size in self.sizes.items())
+        return f"HybridResult(size={len(self.matching)}, core_size={self.core_size}, {stages})"
+
+
+def dense_core(num_vertices, edges, density=CORE_DENSITY, max_size=MAX_CORE_SIZE, core=None):
+    # k-cores are nested, so the size of every core and the number of edges
+    # inside it come from one pass over the core numbers.
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if len(edges) == 0:
+        return np.empty(0, dtype=np.int64)
+    if core is None:
+        core = core_numbers(num_vertices, *to_csr(num_vertices, edges))
+    top = int(core.max())
+    sizes = np.cumsum(np.bincount(core, minlength=top + 1)[::-1])[::-1]
+    inner = np.cumsum(np.bincount(core[edges].min(axis=1), minlength=top + 1)[::-1])[::-1]
+    fits = (sizes >= 2) & (sizes <= max_size) & (inner >= density * sizes * (sizes - 1) / 2)
+    if not fits.any():
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(core >= np.flatnonzero(fits)[0])
+
+
+def hybrid_matching(num_vertices, edges, engine="harvey", density=CORE_DENSITY, max_size=MAX_CORE_SIZE,
+                    short_path_epsilon=SHORT_PATH_EPSILON):
+    # The algebraic engine matches the dense core, a greedy pass matches what
+    # it leaves free and a bounded search takes the short augmenting paths
+    # across the seam. The blossom search then starts from a near-maximum
+    # matching and only has to find the few long paths that are left.
+    from registry import get_engine
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    timings = {}
+    started = time.perf_counter()
+    mate = np.full(num_vertices, -1, dtype=np.int64)
+    core = dense_core(num_vertices, edges, density, max_size)
+    core_pairs = 0
+    if len(core):
+        local = induced_edges(edges, core, num_vertices)
+        try:
+            pairs = get_engine(engine)(len(core), [(int(u), int(v)) for u, v in local])
+        except np.linalg.LinAlgError as e:
+            warnings.warn(f"Core engine {engine} failed ({e}), leaving the core to the blossom search")
+            pairs = []
+        for u, v in pairs:
+            mate[core[u]] = core[v]
+            mate[core[v]] = core[u]
+        core_pairs = len(pairs)
+    timings["core"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = anytime_matching(num_vertices, edges, short_path_epsilon, initial=mate)
+    first = last = next(results)
+    for last in results:
+        pass
+    mate[:] = -1
+    for u, v in last.matching:
+        mate[u] = v
+        mate[v] = u
+    timings["short_paths"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    graph = edmonds_blossom.Graph()
+    for u, v in edges.tolist():
+        graph.add_edge(u, v)
+    matching = edmonds_blossom.Matching()
+    for v in range(num_vertices):
+        matching.add_vertex(v)
+    for u in np.flatnonzero(mate > np.arange(num_vertices)).tolist():
+        matching.add_edge(u, int(mate[u]))
+    edmonds_blossom.complete_matching(graph, matching)
+    pairs = [(int(u), int(v)) for u, v in matching.get_edges()]
+    timings["blossom"] = time.perf_counter() - started
+    sizes = {"core": core_pairs, "greedy": first.size, "short_paths": last.size, "blossom": len(pairs)}
+    return HybridResult(pairs, len(core), sizes, timings)
+
+
+def solve(num_vertices, edges):
+    return hybrid_matching(num_vertices, edges).matching
@@ -0,0 +1,155 @@
+import numpy as np
+from tiled_matrix import TiledMatrix
+from modular_matrix import mod_inv, mod_matmul
+from skew_factorization import add_skew_product, negate, product
+
+# A float core whose smallest singular value is below this fraction of its
+# largest is treated as singular.
+RELATIVE_TOLERANCE = 1e-10
+# LazyElimination applies its pending eliminations once this many vertices
+# have accumulated.
+BATCH_SIZE = 32
+
+
+def delta_block(rows, cols, values, prime=None):
+    # A delta with entries only in rows and columns of `subset` is
+    # P^T block P for the selection P, so it never needs an n x n array.
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    subset, positions = np.unique(np.concatenate([rows, cols]), return_inverse=True)
+    block = np.zeros((len(subset), len(subset)), dtype=float if prime is None else np.int64)
+    np.add.at(block, (positions[:len(rows)], positions[len(rows):]), values)
+    if prime is not None:
+        block %= prime
+    return subset, block
+
+
+def skew_entries(edges, values, prime=None):
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    values = np.asarray(values)
+    negated = -values if prime is None else (prime - values) % prime
+    return (
+        np.concatenate([edges[:, 0], edges[:, 1]]),
+        np.concatenate([edges[:, 1], edges[:, 0]]),
+        np.concatenate([values, negated]),
+    )
+
+
+def gather(inverse, subset):
+    if isinstance(inverse, TiledMatrix):
+        return inverse.take_columns(subset), inverse.take_rows(subset)
+    return inverse[:, subset], inverse[subset, :]
+
+
+def subtract(inverse, left, right, prime=None, skew=False):
+    if isinstance(inverse, TiledMatrix):
+        inverse.subtract_product(left, right)
+    elif skew:
+        # The inverse of a skew-symmetric matrix stays skew-symmetric, so only
+        # the upper half of the product is formed.
+        add_skew_product(inverse, negate(left, prime), right, prime)
+    elif prime is None:
+        inverse -= left @ right
+    else:
+        inverse -= mod_matmul(left, right, prime)
+        inverse %= prime
+
+
+def check_core(core, tolerance):
+    singular_values = np.linalg.svd(core, compute_uv=False)
+    if len(singular_values) and singular_values[-1] <= tolerance * singular_values[0]:
+        raise np.linalg.LinAlgError("Update resulted in singular matrix")
+
+
+def woodbury_update(inverse, rows, cols, values, prime=None, tolerance=RELATIVE_TOLERANCE, skew=False):
+    # (A + P^T B P)^-1 = N - N[:, S] B (I + N[S, S] B)^-1 N[S, :], applied in
+    # place for all changes at once: k changed edges touch at most 2k
+    # vertices, so this is one update of rank at most 2k.
+    subset, block = delta_block(rows, cols, values, prime)
+    if len(subset) == 0:
+        return inverse
+    columns, right = gather(inverse, subset)
+    identity = np.eye(len(subset), dtype=block.dtype)
+    core = identity + product(columns[subset, :], block, prime)
+    if prime is not None:
+        core %= prime
+    core_inverse = invert_core(core, prime, tolerance, "Update resulted in singular matrix")
+    left = product(columns, product(block, core_inverse, prime), prime)
+    subtract(inverse, left, right, prime, skew)
+    return inverse
+
+
+def invert_core(core, prime=None, tolerance=RELATIVE_TOLERANCE, message="Elimination pivot is singular"):
+    if prime is None:
+        check_core(core, tolerance)
+        return np.linalg.inv(core)
+    try:
+        return mod_inv(core, prime)
+    except np.linalg.LinAlgError:
+        raise np.linalg.LinAlgError(message)
+
+
+def eliminate(inverse, subset, prime=None, tolerance=RELATIVE_TOLERANCE, skew=False, core_inverse=None):
+    # Schur complement: afterwards the inverse is that of the matrix with the
+    # subset rows and columns removed, and those rows and columns are zero.
+    subset = np.asarray(subset, dtype=np.int64)
+    columns, rows = gather(inverse, subset)
+    if core_inverse is None:
+        core_inverse = invert_core(columns[subset, :], prime, tolerance)
+    left = product(columns, core_inverse, prime)
+    subtract(inverse, left, rows, prime, skew)
+    return inverse
+
+
+def entries(inverse, rows, cols):
+    return inverse[np.asarray(rows)[:, None], np.asarray(cols)[None, :]]
+
+
+class LazyElimination:
+    # Eliminations that have not reached the inverse yet, kept in product
+    # form: after pending pairs S_1, ..., S_t the current inverse is N - L R,
+    # where L holds the columns N'[:, S_k] and R the rows N'[S_k, S_k]^-1 N'[S_k, :]
+    # of each step's current inverse N'. Each step does the arithmetic of
+    # eliminate() on the entries it reads, and all of them reach N as one
+    # update of rank |L| once `limit` columns have accumulated.
+    def __init__(self, inverse, prime=None, limit=BATCH_SIZE, tolerance=RELATIVE_TOLERANCE, skew=False):
+        self.inverse = inverse
+        self.prime = prime
+        self.limit = limit
+        self.tolerance = tolerance
+        self.skew = skew
+        self.clear()
+
+    def clear(self):
+        dtype = float if self.prime is None else np.int64
+        n = self.inverse.shape[0]
+        self.left = np.empty((n, 0), dtype=dtype)
+        self.right = np.empty((0, n), dtype=dtype)
+
+    def correct(self, values, left, right):
+        correction = product(left, right, self.prime)
+        return values - correction if self.prime is None else (values - correction) % self.prime
+
+    def read(self, rows, cols):
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        return self.correct(entries(self.inverse, rows, cols), self.left[rows], self.right[:, cols])
+
+    def add(self, subset):
+        # Raises LinAlgError, leaving the pending steps unchanged, when the
+        # subset's current core is singular.
+        subset = np.asarray(subset, dtype=np.int64)
+        columns, rows = gather(self.inverse, subset)
+        columns = self.correct(columns, self.left, self.right[:, subset])
+        rows = self.correct(rows, self.left[subset], self.right)
+        core_inverse = invert_core(columns[subset, :], self.prime, self.tolerance)
+        self.left = np.hstack([self.left, columns])
+        self.right = np.vstack([self.right, product(core_inverse, rows, self.prime)])
+        if self.left.shape[1] >= self.limit:
+            self.flush()
+
+    def flush(self):
+        if self.left.shape[1]:
+            subtract(self.inverse, self.left, self.right, self.prime, self.skew)
+            self.clear()
+        return self.inverse
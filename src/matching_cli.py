@@ -0,0 +1,156 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from graph_io import load_graph, save_cache
+from graph_utils import induced_edges
+from registry import available_engines, solve
+from shared_buffers import SharedArena, SharedGraph
+
+
+def solve_task(algorithm, num_vertices, edges, vertices, verbose):
+    start = time.perf_counter()
+    output = sys.stderr if verbose else io.StringIO()
+    if verbose:
+        # The planner logs its choices; workers configure logging themselves.
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with contextlib.redirect_stdout(output):
+        result = solve(algorithm, num_vertices, edges)
+    pairs = np.asarray(sorted(result), dtype=np.int64).reshape(-1, 2)
+    return vertices[pairs], time.perf_counter() - start
+
+
+def solve_shared_task(algorithm, shared, index, verbose):
+    try:
+        vertices = shared.component(index)
+        return solve_task(algorithm, len(vertices), shared.component_edges(index), vertices, verbose)
+    finally:
+        # The matching is copied out of the views, so the segments can be closed here.
+        shared.detach()
+
+
+def split_tasks(graph, by_components):
+    if not by_components:
+        return [(graph.num_vertices, graph.edges, np.arange(graph.num_vertices))]
+    tasks = []
+    for vertices in graph.components():
+        if len(vertices) > 1:
+            tasks.append((len(vertices), induced_edges(graph.edges, vertices, graph.num_vertices), vertices))
+    return tasks
+
+
+def publish_tasks(arena, graph, by_components):
+    components = graph.components() if by_components else None
+    shared = SharedGraph.publish(arena, graph.num_vertices, graph.edges, components)
+    offsets = shared.offsets.attach()
+    return shared, [index for index in range(shared.num_components()) if offsets[index + 1] - offsets[index] > 1]
+
+
+def mate_array(graph, pairs):
+    mate = np.full(graph.labels.max() + 1 if len(graph.labels) else 0, -1, dtype=np.int64)
+    labelled = graph.labels[pairs]
+    mate[labelled[:, 0]] = labelled[:, 1]
+    mate[labelled[:, 1]] = labelled[:, 0]
+    return mate
+
+
+def write_result(args, path, graph, pairs, seconds):
+    if args.format == "npy":
+        stem = os.path.splitext(os.path.basename(path))[0]
+        np.save(os.path.join(args.output_dir, stem + ".mate.npy"), mate_array(graph, pairs))
+    else:
+        record = {
+            "file": path,
+            "algorithm": args.algorithm,
+            "vertices": graph.num_vertices,
+            "edges": len(graph.edges),
+            "size": len(pairs),
+            "seconds": round(seconds, 6),
+            "matching": graph.original_pairs(pairs).tolist(),
+        }
+        if graph.product_offset is not None:
+            record["columns"] = ["user_id", "product_id"]
+        args.output.write(json.dumps(record) + "\n")
+        args.output.flush()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compute maximum matchings for a batch of graph files.")
+    parser.add_argument("files", nargs="+", help="CSV edge lists or .npz graph caches")
+    parser.add_argument("--algorithm", choices=available_engines(), default="auto")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--components", action="store_true", help="solve connected components as separate jobs")
+    parser.add_argument("--format", choices=["jsonl", "npy"], default="jsonl")
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout, help="JSON lines destination")
+    parser.add_argument("--output-dir", default=".", help="directory for .mate.npy files")
+    parser.add_argument("--save-cache", metavar="DIR", help="also write each parsed graph as an .npz cache")
+    parser.add_argument("--verbose", action="store_true", help="forward engine output and planner choices to stderr")
+    return parser.parse_args(argv)
+
+
+def terminate(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    executor = ProcessPoolExecutor(args.jobs) if args.jobs > 1 else None
+    # Workers attach to one shared copy of each graph instead of unpickling it per task.
+    arena = SharedArena()
+    # SIGTERM becomes SystemExit so that the shared segments are still unlinked.
+    previous = signal.signal(signal.SIGTERM, terminate)
+    try:
+        pending = []
+        for path in args.files:
+            load_start = time.perf_counter()
+            graph = load_graph(path)
+            load_seconds = time.perf_counter() - load_start
+            if args.save_cache:
+                stem = os.path.splitext(os.path.basename(path))[0]
+                save_cache(os.path.join(args.save_cache, stem + ".npz"), graph)
+            if executor is None:
+                tasks = split_tasks(graph, args.components)
+                futures = [partial(solve_task, args.algorithm, *task, args.verbose) for task in tasks]
+            else:
+                shared, indices = publish_tasks(arena, graph, args.components)
+                futures = [executor.submit(solve_shared_task, args.algorithm, shared, index, args.verbose) for index in indices]
+            pending.append((path, graph, load_seconds, futures))
+
+        failures = 0
+        for path, graph, load_seconds, futures in pending:
+            try:
+                results = [future() if executor is None else future.result() for future in futures]
+            except Exception as e:
+                print(f"{path}: failed with {type(e).__name__}: {e}", file=sys.stderr)
+                failures += 1
+                continue
+            pairs = np.concatenate([result[0] for result in results]) if results else np.empty((0, 2), dtype=np.int64)
+            solve_seconds = sum(result[1] for result in results)
+            write_result(args, path, graph, pairs, solve_seconds)
+            print(
+                f"{path}: n={graph.num_vertices} m={len(graph.edges)} jobs={len(futures)} "
+                f"matched={len(pairs)} load={load_seconds:.3f}s solve={solve_seconds:.3f}s"
+                + ("" if graph.product_offset is None else f" product_offset={graph.product_offset}"),
+                file=sys.stderr,
+            )
+    finally:
+        # After a failure, queued tasks are cancelled; running ones finish.
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        arena.close()
+        signal.signal(signal.SIGTERM, previous)
+    print(f"total: {len(args.files)} files, {failures} failed, {time.perf_counter() - started:.3f}s", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import hashlib
+import pickle
+import sqlite3
+import sys
+from collections import OrderedDict
+import numpy as np
+from modular_matrix import DEFAULT_PRIME, mod_inv, mod_lu, mod_rank, random_tutte_matrix
+
+
+def graph_edges(graph):
+    return graph.num_vertices, graph.adjacency.edges()
+
+
+def canonical_edges(edges):
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = np.sort(edges, axis=1)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    return np.unique(edges, axis=0)
+
+
+def graph_fingerprint(num_vertices, edges):
+    digest = hashlib.sha256()
+    digest.update(np.int64(num_vertices).tobytes())
+    digest.update(canonical_edges(edges).tobytes())
+    return digest.hexdigest()
+
+
+def entry_size(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(entry_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        size = entry_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.total_bytes -= self.sizes[key]
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.sizes[key] = size
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            old_key, _ = self.entries.popitem(last=False)
+            self.total_bytes -= self.sizes.pop(old_key)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskCache:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(fingerprint TEXT, kind TEXT, value BLOB, PRIMARY KEY (fingerprint, kind))"
+        )
+        self.connection.commit()
+
+    def get(self, key):
+        row = self.connection.execute(
+            "SELECT value FROM results WHERE fingerprint = ? AND kind = ?", key
+        ).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def put(self, key, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (*key, pickle.dumps(value))
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def default_matching_solver(num_vertices, edges, prime):
+    from mucha_sankowski_general import TutteGraph
+    graph = TutteGraph(num_vertices, prime=prime)
+    for u, v in edges:
+        graph.add_edge(int(u), int(v))
+    return graph.get_max_matching()
+
+
+class MatchingOracle:
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, path=None, prime=DEFAULT_PRIME, seed=None):
+        self.memory = LRUCache(max_bytes)
+        self.disk = None if path is None else DiskCache(path)
+        self.prime = prime
+        self.rng = np.random.default_rng(seed)
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+    def describe(self, graph):
+        if isinstance(graph, tuple):
+            num_vertices, edges = graph
+            edges = canonical_edges(edges)
+        else:
+            num_vertices, edges = graph_edges(graph)
+        return num_vertices, edges, graph_fingerprint(num_vertices, edges)
+
+    def lookup(self, key, persistent=True):
+        value = self.memory.get(key)
+        if value is None and persistent and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def store(self, key, value, persistent=True):
+        self.memory.put(key, value)
+        if persistent and self.disk is not None:
+            self.disk.put(key, value)
+
+    def factorization(self, graph):
+        num_vertices, edges, fingerprint = self.describe(graph)
+        key = (fingerprint, "lu")
+        cached = self.lookup(key, persistent=False)
+        if cached is not None:
+            return cached
+        matrix = random_tutte_matrix(num_vertices, edges, self.prime, self.rng)
+        try:
+            LU, perm = mod_lu(matrix, self.prime)
+        except np.linalg.LinAlgError:
+            return None
+        factorization = (matrix, LU, perm)
+        self.store(key, factorization, persistent=False)
+        return factorization
+
+    def has_perfect_matching(self, graph, times=1):
+        num_vertices, edges, fingerprint = self.describe(graph)
+        key = (fingerprint, "perfect")
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+        result = False
+        for _ in range(times):
+            if self.factorization((num_vertices, edges)) is not None:
+                result = True
+                break
+        self.store(key, result)
+        return result
+
+    def matching_size(self, graph):
+        num_vertices, edges, fingerprint = self.describe(graph)
+        key = (fingerprint, "rank")
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached // 2
+        if (fingerprint, "lu") in self.memory:
+            rank = num_vertices
+        else:
+            rank = mod_rank(random_tutte_matrix(num_vertices, edges, self.prime, self.rng), self.prime)
+        self.store(key, rank)
+        return rank // 2
+
+    def tutte_inverse(self, graph):
+        num_vertices, edges, fingerprint = self.describe(graph)
+        key = (fingerprint, "inverse")
+        cached = self.lookup(key, persistent=False)
+        if cached is not None:
+            return cached
+        factorization = self.factorization((num_vertices, edges))
+        if factorization is None:
+            return None
+        matrix = factorization[0]
+        inverse = (matrix, mod_inv(matrix, self.prime))
+        self.store(key, inverse, persistent=False)
+        return inverse
+
+    def maximum_matching(self, graph, solver=default_matching_solver):
+        num_vertices, edges, fingerprint = self.describe(graph)
+        key = (fingerprint, "matching")
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+        matching = solver(num_vertices, edges, self.prime)
+        if isinstance(matching, list):
+            self.store(key, matching)
+        return matching
@@ -0,0 +1,385 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from modular_matrix import DEFAULT_PRIME, batched_mod_inv, batched_mod_inverse, batched_pivot_columns
+from registry import available_engines, solve
+from wiedemann import sparse_matching_size
+
+# Graphs up to this many vertices are padded into one stacked matrix per batch.
+# Above it a single graph's O(n^3) elimination outweighs the per-call overhead
+# that batching saves, so it goes to the process pool instead.
+BATCH_VERTICES = 64
+MAX_LINE = 1 << 26
+
+
+def stacked_tutte_matrices(graphs, p=DEFAULT_PRIME, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    size = max(num_vertices for num_vertices, _ in graphs)
+    stack = np.zeros((len(graphs), size, size), dtype=np.int64)
+    mask = np.zeros(stack.shape, dtype=bool)
+    for t, (_, edges) in enumerate(graphs):
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        values = rng.integers(1, p, len(edges))
+        stack[t, edges[:, 0], edges[:, 1]] = values
+        stack[t, edges[:, 1], edges[:, 0]] = p - values
+        mask[t, edges[:, 0], edges[:, 1]] = True
+        mask[t, edges[:, 1], edges[:, 0]] = True
+    return stack, mask
+
+
+def batched_matching_size(graphs, p=DEFAULT_PRIME, rng=None):
+    stack, _ = stacked_tutte_matrices(graphs, p, rng)
+    return (batched_pivot_columns(stack, p).sum(axis=1) // 2).tolist()
+
+
+def batched_maximum_matching(graphs, p=DEFAULT_PRIME, rng=None):
+    stack, mask = stacked_tutte_matrices(graphs, p, rng)
+    batch, size, _ = stack.shape
+    # Pivot columns of a skew-symmetric matrix also index independent rows,
+    # so they pick a nonsingular principal submatrix. The other vertices,
+    # padding included, get a unit diagonal instead, which keeps every
+    # matrix in the stack invertible with one batched call.
+    free = batched_pivot_columns(stack, p)
+    stack[~(free[:, :, None] & free[:, None, :])] = 0
+    stack[:, np.arange(size), np.arange(size)] = ~free
+    inverse = batched_mod_inv(stack, p)
+    mask &= free[:, :, None] & free[:, None, :]
+    matchings = [[] for _ in graphs]
+    # Rabin-Vazirani, one matched edge per graph per step: an edge with a
+    # nonzero inverse entry is allowed, and eliminating its endpoints leaves
+    # the inverse of the remaining submatrix.
+    while True:
+        active = np.flatnonzero(free.any(axis=1))
+        if len(active) == 0:
+            return matchings
+        N = inverse[active]
+        allowed = (mask[active] & (N != 0)).reshape(len(active), -1)
+        if not allowed.any(axis=1).all():
+            raise np.linalg.LinAlgError("No allowed edge left in a nonsingular Tutte submatrix")
+        i, j = np.divmod(allowed.argmax(axis=1), size)
+        # The pivot block [[0, a], [-a, 0]] has inverse [[0, -1/a], [1/a, 0]],
+        # so the Schur complement update is (N[:, j] N[i, :] - N[:, i] N[j, :]) / a.
+        scale = batched_mod_inverse(N[np.arange(len(active)), i, j], p)[:, None]
+        col_i = N[np.arange(len(active)), :, i] * scale % p
+        col_j = N[np.arange(len(active)), :, j] * scale % p
+        row_i = N[np.arange(len(active)), i, :]
+        row_j = N[np.arange(len(active)), j, :]
+        N = (N - col_j[:, :, None] * row_i[:, None, :] + col_i[:, :, None] * row_j[:, None, :]) % p
+        inverse[active] = N
+        for t, u, v in zip(active, i, j):
+            free[t, [u, v]] = False
+            mask[t, [u, v], :] = False
+            mask[t, :, [u, v]] = False
+            matchings[t].append((int(u), int(v)))
+
+
+def solve_matching(algorithm, num_vertices, edges):
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = solve(algorithm, num_vertices, edges)
+    return [(int(u), int(v)) for u, v in result]
+
+
+def solve_matching_size(num_vertices, edges):
+    return sparse_matching_size(num_vertices, edges)
+
+
+class ServiceRequest:
+    def __init__(self, kind, num_vertices, edges, future):
+        self.kind = kind
+        self.num_vertices = num_vertices
+        self.edges = edges
+        self.future = future
+        self.submitted = time.perf_counter()
+
+
+class MatchingService:
+    KINDS = ("matching", "size")
+
+    def __init__(self, algorithm="auto", jobs=None, max_pending=1024, batch_size=64, batch_window=2e-3,
+                 batch_vertices=BATCH_VERTICES, prime=DEFAULT_PRIME, seed=None, history=10000):
+        self.algorithm = algorithm
+        self.jobs = jobs or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.batch_vertices = batch_vertices
+        self.prime = prime
+        self.rng = np.random.default_rng(seed)
+        self.latencies = deque(maxlen=history)
+        self.queue = None
+        self.pool = None
+        self.worker = None
+        # Requests taken off the queue but not yet answered: the batch being
+        # collected or solved, and the ones handed to the pool.
+        self.batch = []
+        self.dispatched = set()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self.batched = 0
+        self.pooled = 0
+
+    async def start(self):
+        # Both bounds apply backpressure: submit() waits while the queue is
+        # full, and the queue stops draining while the pool has no free slot.
+        self.queue = asyncio.Queue(self.max_pending)
+        self.slots = asyncio.Semaphore(2 * self.jobs)
+        self.pool = ProcessPoolExecutor(self.jobs)
+        self.worker = asyncio.create_task(self.run())
+        return self
+
+    async def close(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.worker
+            self.worker = None
+        pending = self.batch + list(self.dispatched)
+        while self.queue is not None and not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for request in pending:
+            if not request.future.done():
+                request.future.set_exception(RuntimeError("Matching service closed"))
+        self.batch = []
+        self.dispatched.clear()
+        if self.pool is not None:
+            # Waiting for running workers would block the event loop; their
+            # callers have already been answered.
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def submit(self, kind, num_vertices, edges):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown request kind {kind!r}, expected one of {self.KINDS}")
+        if self.worker is None:
+            raise RuntimeError("Matching service is not running")
+        if isinstance(num_vertices, bool) or not isinstance(num_vertices, (int, np.integer)) or num_vertices < 0:
+            raise ValueError(f"Number of vertices must be a nonnegative integer, got {num_vertices!r}")
+        num_vertices = int(num_vertices)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        if len(edges) and (edges.min() < 0 or edges.max() >= num_vertices):
+            raise ValueError(f"Edge endpoint outside 0..{num_vertices - 1}")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(ServiceRequest(kind, num_vertices, edges, future))
+        return future
+
+    async def matching(self, num_vertices, edges):
+        return await (await self.submit("matching", num_vertices, edges))
+
+    async def matching_size(self, num_vertices, edges):
+        return await (await self.submit("size", num_vertices, edges))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.collect()
+            self.in_flight += len(batch)
+            try:
+                results = await loop.run_in_executor(None, self.solve_batch, batch)
+            except np.linalg.LinAlgError:
+                # An unlucky instantiation; each graph is retried on its own.
+                results = None
+            except Exception as e:
+                # Only this batch fails; the loop keeps serving the others.
+                self.failed += len(batch)
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                self.batch = []
+                continue
+            finally:
+                self.in_flight -= len(batch)
+            if results is None:
+                for request in batch:
+                    await self.dispatch(request)
+                self.batch = []
+                continue
+            self.batches += 1
+            self.batched += len(batch)
+            for request, result in zip(batch, results):
+                self.finish(request, result)
+            self.batch = []
+
+    async def collect(self):
+        # Waits for one small request, then gives others batch_window seconds
+        # to arrive so that they share its stacked solve.
+        loop = asyncio.get_running_loop()
+        batch = self.batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            try:
+                if deadline is None:
+                    request = await self.queue.get()
+                elif not self.queue.empty():
+                    request = self.queue.get_nowait()
+                else:
+                    request = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if request.future.cancelled():
+                continue
+            if request.num_vertices > self.batch_vertices:
+                await self.dispatch(request)
+                continue
+            batch.append(request)
+            if deadline is None:
+                deadline = loop.time() + self.batch_window
+        return batch
+
+    def solve_batch(self, batch):
+        # Requests are grouped by kind and by padded size, a power of two, so
+        # that a few large graphs do not inflate the stack for the small ones.
+        groups = {}
+        for k, request in enumerate(batch):
+            groups.setdefault((request.kind, (max(request.num_vertices, 2) - 1).bit_length()), []).append(k)
+        results = [None] * len(batch)
+        for (kind, _), positions in groups.items():
+            method = batched_matching_size if kind == "size" else batched_maximum_matching
+            graphs = [(batch[k].num_vertices, batch[k].edges) for k in positions]
+            for k, result in zip(positions, method(graphs, self.prime, self.rng)):
+                results[k] = result
+        return results
+
+    async def dispatch(self, request):
+        self.dispatched.add(request)
+        await self.slots.acquire()
+        self.in_flight += 1
+        self.pooled += 1
+        loop = asyncio.get_running_loop()
+        if request.kind == "size":
+            done = loop.run_in_executor(self.pool, solve_matching_size, request.num_vertices, request.edges)
+        else:
+            done = loop.run_in_executor(self.pool, solve_matching, self.algorithm, request.num_vertices, request.edges)
+        done.add_done_callback(partial(self.settle, request))
+
+    def settle(self, request, done):
+        self.dispatched.discard(request)
+        self.slots.release()
+        self.in_flight -= 1
+        if done.cancelled() or done.exception() is not None:
+            self.failed += 1
+            if not request.future.done():
+                request.future.set_exception(done.exception() if not done.cancelled() else RuntimeError("Request cancelled"))
+            return
+        self.finish(request, done.result())
+
+    def finish(self, request, result):
+        self.latencies.append(time.perf_counter() - request.submitted)
+        self.completed += 1
+        if not request.future.done():
+            request.future.set_result(result)
+
+    def stats(self):
+        latencies = np.asarray(self.latencies)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) else (None,) * 3
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "batches": self.batches,
+            "mean_batch_size": self.batched / self.batches if self.batches else 0.0,
+            "pooled": self.pooled,
+            "latency_p50": p50,
+            "latency_p90": p90,
+            "latency_p99": p99,
+        }
+
+
+async def reply(writer, request_id, kind, future):
+    try:
+        result = await future
+        response = {"id": request_id, kind: result}
+    except Exception as e:
+        response = {"id": request_id, "error": f"{type(e).__name__}: {e}"}
+    writer.write((json.dumps(response) + "\n").encode())
+    await writer.drain()
+
+
+async def handle_connection(service, reader, writer):
+    # One JSON object per line, e.g. {"id": 1, "op": "size", "num_vertices": 4,
+    # "edges": [[0, 1], [2, 3]]}; answers carry the same id and may arrive out
+    # of order. Reading pauses while submit() waits, which pushes backpressure
+    # back to the client.
+    replies = set()
+    while line := await reader.readline():
+        request_id = None
+        try:
+            message = json.loads(line)
+            request_id = message.get("id")
+            op = message.get("op")
+            if op == "stats":
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(service.stats())
+            else:
+                future = await service.submit(op, int(message["num_vertices"]), message.get("edges", []))
+        except Exception as e:
+            op, future = "error", asyncio.get_running_loop().create_future()
+            future.set_exception(e)
+        task = asyncio.create_task(reply(writer, request_id, op, future))
+        replies.add(task)
+        task.add_done_callback(replies.discard)
+    await asyncio.gather(*replies)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def serve(path, **options):
+    async with MatchingService(**options) as service:
+        server = await asyncio.start_unix_server(partial(handle_connection, service), path, limit=MAX_LINE)
+        print(f"Matching service listening on {path}", file=sys.stderr)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve matching requests over a Unix socket.")
+    parser.add_argument("socket", help="path of the Unix socket to listen on")
+    parser.add_argument("--algorithm", choices=available_engines(), default="auto", help="engine for large graphs")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes for large graphs")
+    parser.add_argument("--max-pending", type=int, default=1024, help="queued requests before submit() waits")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--batch-window", type=float, default=2e-3, help="seconds to wait for a batch to fill")
+    parser.add_argument("--batch-vertices", type=int, default=BATCH_VERTICES, help="largest graph that is batched")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with contextlib.suppress(KeyboardInterrupt, asyncio.CancelledError):
+        asyncio.run(serve(
+            args.socket,
+            algorithm=args.algorithm,
+            jobs=args.jobs,
+            max_pending=args.max_pending,
+            batch_size=args.batch_size,
+            batch_window=args.batch_window,
+            batch_vertices=args.batch_vertices,
+        ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
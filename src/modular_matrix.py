@@ -0,0 +1,289 @@
+import numpy as np
+
+DEFAULT_PRIME = 67108859
+LIMB_BITS = 13
+LIMB_MASK = (1 << LIMB_BITS) - 1
+BLOCK_SIZE = 64
+
+# The left operand is split into two 13-bit limbs and each limb is multiplied
+# by the whole right operand, so every product stays below 2^39 and a float64
+# dot product of this many terms stays below 2^53: BLAS accumulates it exactly,
+# and reduction is delayed until a whole inner block has been summed.
+EXACT_INNER_LENGTH = (1 << 53) // ((LIMB_MASK + 1) << (2 * LIMB_BITS))
+
+
+def check_prime(p):
+    if p >= 1 << (2 * LIMB_BITS):
+        raise ValueError(f"Prime {p} does not fit the {2 * LIMB_BITS}-bit limb split")
+
+
+def reduce(matrix, p=DEFAULT_PRIME):
+    return np.mod(np.asarray(matrix, dtype=np.int64), p)
+
+
+def mod_inverse(value, p=DEFAULT_PRIME):
+    value = int(value) % p
+    if value == 0:
+        raise ZeroDivisionError("Zero has no inverse modulo p")
+    return pow(value, p - 2, p)
+
+
+def mod_matmul(A, B, p=DEFAULT_PRIME):
+    check_prime(p)
+    A = reduce(A, p)
+    B = reduce(B, p).astype(float)
+    a_hi, a_lo = (A >> LIMB_BITS).astype(float), (A & LIMB_MASK).astype(float)
+    result = np.zeros((A.shape[0], B.shape[1]), dtype=np.int64)
+    for s in range(0, A.shape[1], EXACT_INNER_LENGTH):
+        e = s + EXACT_INNER_LENGTH
+        hi = (a_hi[:, s:e] @ B[s:e]).astype(np.int64)
+        hi %= p
+        hi <<= LIMB_BITS
+        hi += (a_lo[:, s:e] @ B[s:e]).astype(np.int64)
+        hi %= p
+        result += hi
+    result %= p
+    return result
+
+
+def eliminate_panel(panel, start, pivots, p):
+    b = panel.shape[1]
+    for t in range(b):
+        k = start + t
+        nonzero = np.flatnonzero(panel[k:, t])
+        if len(nonzero) == 0:
+            raise np.linalg.LinAlgError("Singular matrix modulo p")
+        r = k + nonzero[0]
+        if r != k:
+            panel[[k, r]] = panel[[r, k]]
+        pivots[k] = r
+        pivot_inverse = mod_inverse(panel[k, t], p)
+        panel[k, t] = 1
+        panel[k] = panel[k] * pivot_inverse % p
+        factors = panel[:, t].copy()
+        factors[k] = 0
+        panel[:, t] = 0
+        panel[k, t] = pivot_inverse
+        panel -= np.outer(factors, panel[k])
+        panel %= p
+
+
+def mod_inv(A, p=DEFAULT_PRIME, block_size=BLOCK_SIZE):
+    check_prime(p)
+    A = reduce(A, p).copy()
+    n = A.shape[0]
+    pivots = np.arange(n)
+    # Blocked Gauss-Jordan: each column panel is eliminated on its own, and
+    # its accumulated transform reaches the rest of the matrix in one product.
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        panel = A[:, start:end].copy()
+        eliminate_panel(panel, start, pivots, p)
+        for k in range(start, end):
+            r = pivots[k]
+            if r != k:
+                A[[k, r]] = A[[r, k]]
+        for rest in (slice(0, start), slice(end, n)):
+            pivot_rows = A[start:end, rest].copy()
+            A[start:end, rest] = 0
+            A[:, rest] += mod_matmul(panel, pivot_rows, p)
+            A[:, rest] %= p
+        A[:, start:end] = panel
+
+    order = np.arange(n)
+    for k in range(n - 1, -1, -1):
+        r = pivots[k]
+        if r != k:
+            order[[k, r]] = order[[r, k]]
+    return A[:, order]
+
+
+def mod_lu(A, p=DEFAULT_PRIME, block_size=BLOCK_SIZE):
+    check_prime(p)
+    LU = reduce(A, p).copy()
+    n = LU.shape[0]
+    perm = np.arange(n)
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        for k in range(start, end):
+            nonzero = np.flatnonzero(LU[k:, k])
+            if len(nonzero) == 0:
+                raise np.linalg.LinAlgError("Singular matrix modulo p")
+            r = k + nonzero[0]
+            if r != k:
+                LU[[k, r]] = LU[[r, k]]
+                perm[[k, r]] = perm[[r, k]]
+            LU[k + 1:, k] = LU[k + 1:, k] * mod_inverse(LU[k, k], p) % p
+            LU[k + 1:, k + 1:end] = (LU[k + 1:, k + 1:end] - np.outer(LU[k + 1:, k], LU[k, k + 1:end]) % p) % p
+        for k in range(start, end):
+            LU[k + 1:end, end:] = (LU[k + 1:end, end:] - np.outer(LU[k + 1:end, k], LU[k, end:]) % p) % p
+        if end < n:
+            LU[end:, end:] = (LU[end:, end:] - mod_matmul(LU[end:, start:end], LU[start:end, end:], p)) % p
+    return LU, perm
+
+
+def mod_det(A, p=DEFAULT_PRIME):
+    try:
+        LU, perm = mod_lu(A, p)
+    except np.linalg.LinAlgError:
+        return 0
+    det = 1
+    for value in np.diag(LU):
+        det = det * int(value) % p
+    swaps = len(perm) - len(cycles(perm))
+    return det if swaps % 2 == 0 else (p - det) % p
+
+
+def cycles(perm):
+    seen = np.zeros(len(perm), dtype=bool)
+    found = []
+    for start in range(len(perm)):
+        if not seen[start]:
+            cycle = []
+            v = start
+            while not seen[v]:
+                seen[v] = True
+                cycle.append(v)
+                v = perm[v]
+            found.append(cycle)
+    return found
+
+
+def mod_rank_profile(A, p=DEFAULT_PRIME, block_size=BLOCK_SIZE):
+    # Returns independent rows and the pivot columns found with them; the
+    # two index a nonsingular square submatrix of full rank.
+    check_prime(p)
+    M = reduce(A, p).copy()
+    rows, cols = M.shape
+    order = np.arange(rows)
+    rank = 0
+    all_pivot_cols = []
+    # Right-looking blocked elimination that skips dependent columns: each
+    # column panel is reduced on its own, storing the multipliers below its
+    # pivots, and the trailing columns are then updated with one product.
+    for start in range(0, cols, block_size):
+        end = min(start + block_size, cols)
+        first = rank
+        pivot_cols = []
+        for c in range(start, end):
+            if rank == rows:
+                break
+            nonzero = np.flatnonzero(M[rank:, c])
+            if len(nonzero) == 0:
+                continue
+            r = rank + nonzero[0]
+            if r != rank:
+                M[[rank, r]] = M[[r, rank]]
+                order[[rank, r]] = order[[r, rank]]
+            factors = M[rank + 1:, c] * mod_inverse(M[rank, c], p) % p
+            M[rank + 1:, c + 1:end] = (M[rank + 1:, c + 1:end] - np.outer(factors, M[rank, c + 1:end])) % p
+            M[rank + 1:, c] = factors
+            pivot_cols.append(c)
+            rank += 1
+        all_pivot_cols += pivot_cols
+        if rank > first and end < cols:
+            lower = M[first:rank, pivot_cols]
+            upper = M[first:rank, end:]
+            for i in range(1, rank - first):
+                upper[i] = (upper[i] - lower[i, :i] @ upper[:i] % p) % p
+            M[rank:, end:] = (M[rank:, end:] - mod_matmul(M[rank:, pivot_cols], upper, p)) % p
+    return np.sort(order[:rank]), np.array(all_pivot_cols, dtype=np.int64)
+
+
+def mod_independent_rows(A, p=DEFAULT_PRIME, block_size=BLOCK_SIZE):
+    return mod_rank_profile(A, p, block_size)[0]
+
+
+def mod_rank(A, p=DEFAULT_PRIME):
+    return len(mod_independent_rows(A, p))
+
+
+def random_tutte_matrix(num_vertices, edges, p=DEFAULT_PRIME, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    matrix = np.zeros((num_vertices, num_vertices), dtype=np.int64)
+    values = rng.integers(1, p, len(edges))
+    matrix[edges[:, 0], edges[:, 1]] = values
+    matrix[edges[:, 1], edges[:, 0]] = p - values
+    return matrix
+
+
+def maximum_rank_vertices(num_vertices, edges, p=DEFAULT_PRIME, rng=None):
+    # Rows spanning the row space of a skew-symmetric matrix index a
+    # nonsingular principal submatrix, so the induced subgraph on them has a
+    # perfect matching covering as many vertices as a maximum matching of G.
+    return mod_independent_rows(random_tutte_matrix(num_vertices, edges, p, rng), p)
+
+
+# Batched routines work on a stack of small matrices at once, vectorising each
+# elimination step across the stack instead of looping over the matrices.
+def batched_mod_inverse(values, p=DEFAULT_PRIME):
+    values = reduce(values, p)
+    if np.any(values == 0):
+        raise ZeroDivisionError("Zero has no inverse modulo p")
+    result = np.ones_like(values)
+    exponent = p - 2
+    while exponent:
+        if exponent & 1:
+            result = result * values % p
+        values = values * values % p
+        exponent >>= 1
+    return result
+
+
+def batched_pivot_columns(A, p=DEFAULT_PRIME):
+    check_prime(p)
+    M = reduce(A, p).copy()
+    batch, rows, cols = M.shape
+    index = np.arange(rows)
+    rank = np.zeros(batch, dtype=np.int64)
+    pivots = np.zeros((batch, cols), dtype=bool)
+    for c in range(cols):
+        candidates = (M[:, :, c] != 0) & (index >= rank[:, None])
+        active = np.flatnonzero(candidates.any(axis=1))
+        if len(active) == 0:
+            continue
+        r, k = candidates[active].argmax(axis=1), rank[active]
+        top = M[active, k].copy()
+        M[active, k] = M[active, r]
+        M[active, r] = top
+        pivot_rows = M[active, k] * batched_mod_inverse(M[active, k, c], p)[:, None] % p
+        factors = np.where(index > k[:, None], M[active, :, c], 0)
+        M[active] = (M[active] - factors[:, :, None] * pivot_rows[:, None, :]) % p
+        pivots[active, c] = True
+        rank[active] += 1
+    return pivots
+
+
+def batched_mod_inv(A, p=DEFAULT_PRIME):
+    check_prime(p)
+    M = reduce(A, p).copy()
+    batch, n, _ = M.shape
+    stack = np.arange(batch)
+    swaps = np.empty((n, batch), dtype=np.int64)
+    # In-place Gauss-Jordan as in eliminate_panel, with each product below
+    # 2^52 so that a single reduction per step suffices.
+    for k in range(n):
+        candidates = M[:, k:, k] != 0
+        if not candidates.any(axis=1).all():
+            raise np.linalg.LinAlgError("Singular matrix modulo p")
+        r = swaps[k] = k + candidates.argmax(axis=1)
+        top = M[stack, k].copy()
+        M[stack, k] = M[stack, r]
+        M[stack, r] = top
+        pivot_inverse = batched_mod_inverse(M[:, k, k], p)
+        M[:, k, k] = 1
+        M[:, k] *= pivot_inverse[:, None]
+        M[:, k] %= p
+        factors = M[:, :, k].copy()
+        factors[:, k] = 0
+        M[:, :, k] = 0
+        M[:, k, k] = pivot_inverse
+        M -= factors[:, :, None] * M[:, None, k, :]
+        M %= p
+    for k in range(n - 1, -1, -1):
+        r = swaps[k]
+        left = M[stack, :, k].copy()
+        M[stack, :, k] = M[stack, :, r]
+        M[stack, :, r] = left
+    return M
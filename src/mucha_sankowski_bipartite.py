@@ -1,116 +1,183 @@
 import numpy as np
-from random import randint
+from modular_matrix import DEFAULT_PRIME, mod_inv, mod_inverse, mod_matmul, mod_rank_profile
+from graph_utils import is_bipartite
+from bit_adjacency import BitAdjacency
+from harvey import Graph, HarveyAlgorithm
 
 class BipartiteGraph:
     def __init__(self, n):
         self.num_vertices = n
-        self.matrix = [[0] * n for _ in range(n)]
-        
+        self.adjacency = BitAdjacency(n)
+
     def add_edge(self, i, j):
-        self.matrix[i][j] = 1
-        self.matrix[j][i] = 1
+        self.adjacency.add_edge(i, j)
+
+    def add_edges(self, edges):
+        self.adjacency.add_edges(edges)
 
     def get_indeterminate(self, i, j):
         return 'x_{}_{}'.format(i, j)
 
     def get_val(self, i, j):
-        return self.matrix[i][j]
+        return int(self.adjacency.has_edge(i, j))
 
     def print_graph(self):
         print("  ", end=' ')
-        for i in range(len(self.matrix)):
-            print(str(i).center(len(self.get_val(i, i))), end=' ')
+        for i in range(self.num_vertices):
+            print(str(i).center(len(str(self.get_val(i, i)))), end=' ')
         print()
-        for i in range(len(self.matrix)):
+        for i in range(self.num_vertices):
             print(i, end=' ')
-            for j in range(len(self.matrix)):
+            for j in range(self.num_vertices):
                 print(self.get_val(i, j), end=' ')
             print()
 
 class EdmondsMatrix:
-    def __init__(self, graph):
-        self.graph = graph
-        self.size = graph.num_vertices
-        self.matrix = self.construct_matrix()
+    def __init__(self, num_vertices, left, right, edges, prime=DEFAULT_PRIME, rng=None):
+        self.left = np.asarray(left, dtype=np.int64)
+        self.right = np.asarray(right, dtype=np.int64)
+        self.prime = prime
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.matrix = self.construct_matrix(num_vertices, edges)
         self.inverse = None
 
-    def construct_matrix(self):
-        matrix = np.zeros((self.size, self.size), dtype=object)
-        for i in range(self.size):
-            for j in range(self.size):
-                if self.graph.matrix[i][j] != 0:
-                    matrix[i][j] = self.graph.get_indeterminate(i, j)
-                else:
-                    matrix[i][j] = 0
+    def construct_matrix(self, num_vertices, edges):
+        position = np.full(num_vertices, -1, dtype=np.int64)
+        position[self.left] = np.arange(len(self.left))
+        position[self.right] = np.arange(len(self.right))
+        matrix = np.zeros((len(self.left), len(self.right)), dtype=bool)
+        matrix[position[edges[:, 0]], position[edges[:, 1]]] = True
         return matrix
 
     def instantiate(self):
-        instantiated_matrix = np.zeros((self.size, self.size), dtype=float)
-        for i in range(self.size):
-            for j in range(self.size):
-                if self.matrix[i][j] != 0:
-                    instantiated_matrix[i][j] = randint(1, 1000)
-                else:
-                    instantiated_matrix[i][j] = 0
+        instantiated_matrix = np.zeros(self.matrix.shape, dtype=np.int64)
+        instantiated_matrix[self.matrix] = self.rng.integers(1, self.prime, int(self.matrix.sum()))
         return instantiated_matrix
 
     def compute_inverse(self):
-        retry_limit = 10
-        for attempt in range(retry_limit):
-            try:
-                instantiated_matrix = self.instantiate()
-                self.inverse = np.linalg.inv(instantiated_matrix)
-                print(f"Inverse computed on attempt {attempt + 1}")
-                return self.inverse
-            except np.linalg.LinAlgError:
-                print(f"Singular matrix encountered on attempt {attempt + 1}")
-                continue
-        raise np.linalg.LinAlgError("Unable to compute non-singular inverse after several attempts")
-
-    def update_inverse(self, row, col):
-        if self.inverse is None:
-            self.compute_inverse()
-        u = self.inverse[:, col]
-        v = self.inverse[row, :]
-        c = self.inverse[row, col]
-        if np.abs(c) > 1e-10:
-            self.inverse = self.inverse - np.outer(u, v) / c
-        else:
-            print(f"Warning: Small or zero pivot encountered at row {row}, col {col}, skipping update")
+        # The rows and pivot columns of a rank-r matrix meet in a nonsingular
+        # r x r submatrix, whose rows and columns are the two sides of a
+        # maximum matching.
+        instantiated_matrix = self.instantiate()
+        rows, cols = mod_rank_profile(instantiated_matrix, self.prime)
+        self.left = self.left[rows]
+        self.right = self.right[cols]
+        self.matrix = self.matrix[np.ix_(rows, cols)]
+        self.inverse = mod_inv(instantiated_matrix[np.ix_(rows, cols)], self.prime)
+        print(f"Inverse computed for a {len(rows)} x {len(cols)} Edmonds submatrix")
+        return self.inverse
 
 class MuchaSankowski:
-    def __init__(self, graph):
+    LEAF_SIZE = 32
+    # The GF(p) work arrays are dense, so graphs whose arrays would exceed
+    # this many bytes go to Harvey's tiled path instead.
+    MEMORY_LIMIT = 2 << 30
+
+    def __init__(self, graph, prime=None, seed=None, memory_limit=None):
         self.graph = graph
-        self.edmonds_matrix = EdmondsMatrix(graph)
+        self.memory_limit = self.MEMORY_LIMIT if memory_limit is None else memory_limit
+        self.prime = DEFAULT_PRIME if prime is None else prime
+        self.rng = np.random.default_rng(seed)
         self.matching = []
-
-    def match(self, p, q):
-        if p == q:
-            for r in range(self.graph.num_vertices):
-                if self.graph.matrix[p][r] != 0 and round(self.edmonds_matrix.inverse[r, p], 10) != 0:
-                    self.matching.append((p, r))
-                    self.graph.matrix[p][r] = 0
-                    self.graph.matrix[r][p] = 0
-                    self.edmonds_matrix.update_inverse(p, r)
-                    break
-        else:
-            m = (p + q) // 2
-            self.match(p, m)
-            self.match(m + 1, q)
-            self.update_uneliminated_rows(p, q)
-
-    def update_uneliminated_rows(self, start, end):
-        for i in range(start, end + 1):
-            for j in range(self.graph.num_vertices):
-                if self.graph.matrix[i][j] != 0 and round(self.edmonds_matrix.inverse[i][j], 10) != 0:
-                    self.graph.matrix[i][j] = 0
-                    self.graph.matrix[j][i] = 0
+        self.pivots = []
+
+    def graph_edges(self):
+        return self.graph.adjacency.edges()
+
+    def bipartite_edges(self):
+        n = self.graph.num_vertices
+        edges = self.graph_edges()
+        bipartite, colors = is_bipartite(n, edges)
+        if not bipartite:
+            print("Graph is not bipartite, matching only edges between BFS colour classes")
+            edges = edges[colors[edges[:, 0]] != colors[edges[:, 1]]]
+        # Orient every edge from colour class 0 to colour class 1.
+        swap = colors[edges[:, 0]] == 1
+        edges[swap] = edges[swap][:, ::-1]
+        return edges, colors
+
+    def build_edmonds_matrix(self, edges, colors):
+        left, right = np.flatnonzero(colors == 0), np.flatnonzero(colors == 1)
+        return EdmondsMatrix(self.graph.num_vertices, left, right, edges, self.prime, self.rng)
+
+    def match_row(self, i):
+        # Column i of the inverse is current, so its nonzero entries on the
+        # row's edges are exactly the allowed edges; columns already used
+        # have been zeroed by the eliminations.
+        cols = self.row_cols[self.row_start[i]:self.row_start[i + 1]]
+        allowed = cols[self.inverse[cols, i] != 0]
+        if len(allowed) == 0:
+            raise np.linalg.LinAlgError(f"No allowed edge at row {i} of a nonsingular Edmonds matrix")
+        j = int(allowed[0])
+        self.pivots.append((i, j))
+        return j
+
+    def match_leaf(self, lo, hi):
+        p = self.prime
+        for i in range(lo, hi):
+            j = self.match_row(i)
+            if i + 1 < hi:
+                factors = self.inverse[j, i + 1:hi] * mod_inverse(self.inverse[j, i], p) % p
+                block = self.inverse[:, i + 1:hi]
+                self.inverse[:, i + 1:hi] = (block - np.outer(self.inverse[:, i], factors) % p) % p
+
+    def match(self, lo, hi):
+        # Invariant: columns lo..hi-1 of the inverse already reflect every
+        # pivot made before this call. Pivots of the first half reach the
+        # second half in one Schur-complement product, computed from the
+        # first half's columns as they were on entry.
+        if hi - lo <= self.LEAF_SIZE:
+            self.match_leaf(lo, hi)
+            return
+        p = self.prime
+        mid = (lo + hi) // 2
+        snapshot = self.inverse[:, lo:mid].copy()
+        before = len(self.pivots)
+        self.match(lo, mid)
+        pivots = np.asarray(self.pivots[before:], dtype=np.int64).reshape(-1, 2)
+        rows, cols = pivots[:, 0] - lo, pivots[:, 1]
+        core = mod_inv(snapshot[np.ix_(cols, rows)], p)
+        update = mod_matmul(mod_matmul(snapshot[:, rows], core, p), self.inverse[cols, mid:hi], p)
+        self.inverse[:, mid:hi] = (self.inverse[:, mid:hi] - update) % p
+        self.match(mid, hi)
+
+    def dense_footprint(self, colors):
+        # The instantiated Edmonds matrix and its copy in mod_rank_profile,
+        # then the r x r inverse, its copy in mod_inv and the snapshots of
+        # match(), with r at most the smaller colour class.
+        rows, cols = int(np.sum(colors == 0)), int(np.sum(colors == 1))
+        return 8 * (2 * rows * cols + 3 * min(rows, cols) ** 2)
+
+    def get_max_matching_out_of_core(self, edges):
+        graph = Graph(self.graph.num_vertices)
+        graph.add_edges(edges)
+        # Harvey redoes a short floating-point run on GF(p) tiles, so the
+        # result is still a maximum matching.
+        pairs = HarveyAlgorithm(graph, out_of_core_threshold=0).construct_maximum_matching()
+        self.matching.extend((int(i), int(j)) for i, j in pairs)
+        return self.matching
 
     def get_max_matching(self):
-        self.edmonds_matrix.compute_inverse()
-        self.match(0, self.graph.num_vertices - 1)
+        edges, colors = self.bipartite_edges()
+        if self.dense_footprint(colors) > self.memory_limit:
+            return self.get_max_matching_out_of_core(edges)
+        edmonds_matrix = self.build_edmonds_matrix(edges, colors)
+        self.inverse = edmonds_matrix.compute_inverse()
+        size = len(edmonds_matrix.left)
+        rows, cols = np.nonzero(edmonds_matrix.matrix)
+        self.row_start = np.searchsorted(rows, np.arange(size + 1))
+        self.row_cols = cols
+        if size:
+            self.match(0, size)
+        for i, j in self.pivots:
+            self.matching.append((int(edmonds_matrix.left[i]), int(edmonds_matrix.right[j])))
         return self.matching
 
+def solve(num_vertices, edges):
+    graph = BipartiteGraph(num_vertices)
+    graph.add_edges(edges)
+    return MuchaSankowski(graph).get_max_matching()
+
 def main():
     g1 = BipartiteGraph(3)
     g1.add_edge(0, 1)
@@ -0,0 +1,371 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from math import comb
+import numpy as np
+from graph_utils import bfs_levels, connected_components, core_numbers, induced_edges, is_bipartite, to_csr
+from harvey import TutteMatrix
+from hybrid_matching import dense_core
+from modular_matrix import maximum_rank_vertices
+from sparse_lu import DENSE_SPEEDUP, ENVELOPE_SLACK, envelope_work
+
+logger = logging.getLogger(__name__)
+
+# Fitted by calibrate() on near-forests (average degree 1.5), sparse (average
+# degree 5) and dense (density 0.15) random graphs with 128 to 2048 vertices.
+# "scales" multiply the terms of cost_terms() and "memory" is the largest
+# traced peak in bytes per unit of memory_feature(); engines whose answers were
+# not maximum matchings on every calibration graph are left out. The separator
+# engine is fitted on near-forests with 8 to 32 vertices, the only graphs it is
+# eligible for.
+DEFAULT_COSTS = {
+    "rabin-vazirani": {"overhead": 1.37e-1, "scales": [0.0, 2.99e-11], "memory": 64, "reliable": True},
+    "mucha-sankowski-general": {"overhead": 1.29e-1, "scales": [0.0, 2.42e-11], "memory": 64, "reliable": True},
+    "mucha-sankowski-bipartite": {"overhead": 7.2e-3, "scales": [0.0, 1.39e-10], "memory": 14, "reliable": True},
+    "harvey": {"overhead": 2.11e-2, "scales": [3.27e-7, 4.24e-10], "memory": 74, "reliable": True},
+    "bentert-heeger-koana": {"overhead": 3.93e-3, "scales": [6.19e-6], "memory": 1089, "reliable": True},
+    "edmonds-blossom": {"overhead": 7.2e-5, "scales": [2.91e-7, 2.48e-10], "memory": 88, "reliable": True},
+    "sparse-lu": {"overhead": 5.21e-4, "scales": [2.23e-5, 4.3e-9], "memory": 297, "reliable": True},
+    "hybrid": {"overhead": 4.42e-3, "scales": [1.93e-9, 1.38e-8], "memory": 572, "reliable": True},
+}
+
+# Treewidth is at least the degeneracy, so a graph with a dense core has no
+# separator small enough for the exhaustive k-separator search.
+MAX_SEPARATOR = 3
+# Engines whose estimated peak memory exceeds this many bytes are skipped.
+MEMORY_LIMIT = 2 << 30
+# Average degree of the sparse calibration graphs, about that of data/.
+CALIBRATION_DEGREE = 5.0
+# Seconds allowed for one shipped data file in main().
+DATA_BUDGET = 120.0
+
+
+class GraphProfile:
+    def __init__(self, num_vertices, edges):
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.num_vertices = num_vertices
+        self.num_edges = len(edges)
+        pairs = num_vertices * (num_vertices - 1) // 2
+        self.density = self.num_edges / pairs if pairs else 0.0
+        self.bipartite, _ = is_bipartite(num_vertices, edges)
+        self.component_sizes = sorted((len(c) for c in connected_components(num_vertices, edges)), reverse=True)
+        csr = to_csr(num_vertices, edges)
+        core = core_numbers(num_vertices, *csr)
+        self.degeneracy = int(core.max()) if num_vertices else 0
+        # The core the hybrid engine would hand to Harvey, and the bound that
+        # decides whether sparse-lu factors at all.
+        self.core_size = len(dense_core(num_vertices, edges, core=core))
+        self.envelope = envelope_work(num_vertices, edges)
+        self.separator = estimate_separator(num_vertices, edges, csr)
+
+    def describe(self):
+        return (
+            f"n={self.num_vertices} m={self.num_edges} density={self.density:.4f} "
+            f"bipartite={self.bipartite} largest_component={self.component_sizes[0] if self.component_sizes else 0} "
+            f"degeneracy={self.degeneracy} core={self.core_size} separator~{self.separator}"
+        )
+
+
+def estimate_separator(num_vertices, edges, csr=None):
+    # A BFS level from a pseudo-peripheral vertex separates the levels above it
+    # from those below. The estimate is the smallest |level| + largest side over
+    # the levels of the largest component, an upper bound on the separator
+    # parameter k that bentert_heeger_koana searches for.
+    levels, labels, count = bfs_levels(num_vertices, edges, csr)
+    if count == 0:
+        return 0
+    largest = np.argmax(np.bincount(labels))
+    vertices = np.flatnonzero(labels == largest)
+    local = induced_edges(edges, vertices, num_vertices)
+    far = int(np.argmax(levels[vertices]))
+    order = np.concatenate([[far], np.delete(np.arange(len(vertices)), far)])
+    relabel = np.empty(len(vertices), dtype=np.int64)
+    relabel[order] = np.arange(len(vertices))
+    levels, _, _ = bfs_levels(len(vertices), relabel[local])
+    sizes = np.bincount(levels)
+    before = np.cumsum(sizes) - sizes
+    after = len(vertices) - before - sizes
+    return int(np.min(sizes + np.maximum(before, after)))
+
+
+def cost_terms(engine, profile):
+    n, m = profile.num_vertices, profile.num_edges
+    if engine in ("rabin-vazirani", "mucha-sankowski-general"):
+        # One inversion of the remaining Tutte matrix per matched edge: n^4
+        # asymptotically, dominated by the n^3 of Python-level work per edge
+        # at the sizes that finish.
+        return n ** 3, n ** 4
+    if engine in ("harvey", "mucha-sankowski-bipartite"):
+        # O(n) work per entry read and update, then the n^3 of the inversions
+        # and the batched updates of the whole inverse.
+        return n ** 2, n ** 3
+    if engine == "bentert-heeger-koana":
+        k = profile.separator
+        return (sum(comb(n, s) for s in range(1, k + 1)) * (n + m) * k + k ** 3,)
+    if engine == "edmonds-blossom":
+        # A forest search per augmentation, and a contracted copy of the graph
+        # for every nested blossom on the way.
+        return n * m, n * n * m
+    if engine == "hybrid":
+        # Harvey on the dense core, then blossom searches over the whole graph
+        # from the few vertices the short augmenting paths leave exposed.
+        return profile.core_size ** 3, n * m
+    if engine == "sparse-lu":
+        # The symbolic phase per edge, and the elimination bounded by the
+        # breadth-first envelope.
+        return m, profile.envelope
+    raise ValueError(f"No cost model for engine {engine!r}")
+
+
+def memory_feature(engine, profile):
+    n, m = profile.num_vertices, profile.num_edges
+    if engine in ("rabin-vazirani", "mucha-sankowski-general", "mucha-sankowski-bipartite"):
+        return n ** 2
+    if engine == "harvey":
+        # Beyond the threshold the Tutte matrix and its inverse are memmap tiles.
+        return min(n, TutteMatrix.OUT_OF_CORE_THRESHOLD) ** 2
+    if engine == "edmonds-blossom":
+        # Up to one contracted copy of the graph per vertex of a blossom chain.
+        return n * m
+    if engine == "hybrid":
+        return profile.core_size ** 2 + n + m
+    if engine in ("bentert-heeger-koana", "sparse-lu"):
+        return n + m
+    raise ValueError(f"No memory model for engine {engine!r}")
+
+
+def eligible(engine, profile):
+    if engine == "mucha-sankowski-bipartite" and not profile.bipartite:
+        return "graph is not bipartite"
+    if engine == "bentert-heeger-koana" and max(profile.separator, profile.degeneracy) > MAX_SEPARATOR:
+        return f"no separator of size <= {MAX_SEPARATOR}"
+    if engine == "sparse-lu" and profile.envelope > ENVELOPE_SLACK * (profile.num_vertices ** 3 // DENSE_SPEEDUP):
+        return "elimination bound hands the graph to hybrid"
+    return None
+
+
+class Plan:
+    def __init__(self, profile, engine, estimates, reasons):
+        self.profile = profile
+        self.engine = engine
+        self.estimates = estimates
+        self.reasons = reasons
+
+    def describe(self):
+        ranked = ", ".join(f"{name}={seconds:.3g}s" for name, seconds in sorted(self.estimates.items(), key=lambda x: x[1]))
+        skipped = ", ".join(f"{name}: {reason}" for name, reason in self.reasons.items())
+        return f"{self.engine} for {self.profile.describe()}; estimates {ranked}; skipped {skipped or 'none'}"
+
+
+class Planner:
+    def __init__(self, costs=None, memory_limit=MEMORY_LIMIT):
+        self.costs = DEFAULT_COSTS if costs is None else costs
+        self.memory_limit = memory_limit
+        self.history = []
+
+    def estimate(self, engine, profile):
+        cost = self.costs[engine]
+        return cost["overhead"] + sum(s * float(t) for s, t in zip(cost["scales"], cost_terms(engine, profile)))
+
+    def estimate_memory(self, engine, profile):
+        return self.costs[engine]["memory"] * float(memory_feature(engine, profile))
+
+    def plan(self, num_vertices, edges):
+        profile = GraphProfile(num_vertices, edges)
+        estimates, reasons = {}, {}
+        for engine, cost in self.costs.items():
+            reason = "failed calibration" if not cost["reliable"] else eligible(engine, profile)
+            if reason is None and self.estimate_memory(engine, profile) > self.memory_limit:
+                reason = f"needs ~{self.estimate_memory(engine, profile) / 2 ** 20:.0f} MB"
+            if reason is None:
+                estimates[engine] = self.estimate(engine, profile)
+            else:
+                reasons[engine] = reason
+        if not estimates:
+            raise ValueError("No engine is eligible for this graph")
+        plan = Plan(profile, min(estimates, key=estimates.get), estimates, reasons)
+        self.history.append(plan)
+        return plan
+
+    def solve(self, num_vertices, edges):
+        from registry import get_engine
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        # Repeated edges and loops would inflate m in every cost term.
+        edges = np.unique(np.sort(edges[edges[:, 0] != edges[:, 1]], axis=1), axis=0)
+        matching = []
+        # Every engine is superlinear, so components are planned and solved
+        # separately; a single edge needs no engine at all.
+        for vertices in connected_components(num_vertices, edges):
+            if len(vertices) < 2:
+                continue
+            local = induced_edges(edges, vertices, num_vertices)
+            if len(vertices) == 2:
+                matching.append((int(vertices[0]), int(vertices[1])))
+                continue
+            plan = self.plan(len(vertices), local)
+            logger.info("Planner chose %s", plan.describe())
+            pairs = get_engine(plan.engine)(len(vertices), [(int(u), int(v)) for u, v in local])
+            matching.extend((int(vertices[u]), int(vertices[v])) for u, v in pairs)
+        return matching
+
+
+def random_graph(num_vertices, density, bipartite, rng):
+    upper = np.triu(rng.random((num_vertices, num_vertices)) < density, 1)
+    if bipartite:
+        side = rng.random(num_vertices) < 0.5
+        upper &= side[:, None] != side[None, :]
+    rows, cols = np.nonzero(upper)
+    return np.column_stack([rows, cols])
+
+
+def is_matching(edges, pairs):
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    present = set(map(tuple, np.sort(edges, axis=1).tolist()))
+    return len(np.unique(pairs)) == pairs.size and all(tuple(sorted(p)) in present for p in pairs.tolist())
+
+
+def is_maximum(num_vertices, edges, pairs):
+    return is_matching(edges, pairs) and 2 * len(pairs) == len(maximum_rank_vertices(num_vertices, edges))
+
+
+def fit_nonnegative(design, seconds):
+    # Least squares on relative error, so that the small graphs count as much
+    # as the large ones, over every subset of the columns that keeps the last
+    # one; the best fit with no negative coefficient wins. The last column is
+    # the leading term, which the many small graphs would otherwise drop, and
+    # without it estimates would not grow like the engine beyond the
+    # calibration sizes.
+    weighted = design / seconds[:, None]
+    target = np.ones(len(seconds))
+    last = design.shape[1] - 1
+    best, best_error = np.zeros(design.shape[1]), np.inf
+    for size in range(last + 1):
+        for columns in itertools.combinations(range(last), size):
+            columns = list(columns) + [last]
+            solution = np.linalg.lstsq(weighted[:, columns], target, rcond=None)[0]
+            if (solution < 0).any():
+                continue
+            error = np.sum((weighted[:, columns] @ solution - target) ** 2)
+            if error < best_error:
+                best, best_error = np.zeros(design.shape[1]), error
+                best[columns] = solution
+    return best
+
+
+def traced_peak(engine, num_vertices, edges):
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine(num_vertices, edges)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def calibrate(engines=None, sizes=(128, 256, 512, 1024, 2048), trials=2, density=0.15, seed=0, time_limit=60.0):
+    # Sizes increase, and an engine stops at the first size whose runs take
+    # more than time_limit seconds in total or overrun it once.
+    from registry import get_engine
+    from tail_benchmark import BudgetExceeded, deadline
+    rng = np.random.default_rng(seed)
+    costs = {}
+    for engine in DEFAULT_COSTS if engines is None else engines:
+        rows, seconds, peaks, reliable = [], [], [], True
+        separator = engine == "bentert-heeger-koana"
+        for n in (8, 16, 32) if separator else sizes:
+            started, overran, traced = len(seconds), False, set()
+            # Near-forests are the only graphs the separator engine and an
+            # unbounded sparse-lu are eligible for.
+            densities = [1.5 / n] if separator else [1.5 / n, CALIBRATION_DEGREE / n, density]
+            for graph_density, _ in itertools.product(densities, range(trials)):
+                edges = random_graph(n, graph_density, engine == "mucha-sankowski-bipartite", rng)
+                profile = GraphProfile(n, edges)
+                if eligible(engine, profile) is not None:
+                    continue
+                pairs_list = [(int(u), int(v)) for u, v in edges]
+                start = time.perf_counter()
+                try:
+                    with deadline(time_limit):
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            pairs = get_engine(engine)(n, pairs_list)
+                        elapsed = time.perf_counter() - start
+                        # The traced run is slower, so it only measures memory.
+                        if graph_density not in traced:
+                            traced.add(graph_density)
+                            peak = traced_peak(get_engine(engine), n, pairs_list)
+                            peaks.append(peak / max(memory_feature(engine, profile), 1))
+                except BudgetExceeded:
+                    overran = True
+                    break
+                except Exception:
+                    reliable = False
+                    continue
+                seconds.append(elapsed)
+                reliable &= isinstance(pairs, list) and is_maximum(n, edges, pairs)
+                rows.append([1.0] + [float(t) for t in cost_terms(engine, profile)])
+            if overran or len(seconds) == started or sum(seconds[started:]) > time_limit:
+                break
+        if seconds:
+            fit = fit_nonnegative(np.array(rows), np.array(seconds))
+            overhead, scales = float(fit[0]), [float(s) for s in fit[1:]]
+        else:
+            overhead, scales, reliable = 0.0, [0.0] * len(cost_terms(engine, GraphProfile(2, [(0, 1)]))), False
+        costs[engine] = {"overhead": overhead, "scales": scales, "memory": max(peaks, default=0.0),
+                         "reliable": bool(reliable)}
+    return costs
+
+
+def save_costs(path, costs):
+    with open(path, "w") as handle:
+        json.dump(costs, handle, indent=2)
+
+
+def load_costs(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def solve(num_vertices, edges):
+    return Planner().solve(num_vertices, edges)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the planner finishes on the shipped graph files.")
+    parser.add_argument("files", nargs="+", help="CSV edge lists or .npz graph caches, e.g. ../data/*.csv")
+    parser.add_argument("--time-budget", type=float, default=DATA_BUDGET, help="seconds allowed per file")
+    parser.add_argument("--costs", help="JSON costs written by save_costs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from graph_io import load_graph
+    from tail_benchmark import BudgetExceeded, deadline
+    args = parse_args(argv)
+    planner = Planner(None if args.costs is None else load_costs(args.costs))
+    failures = 0
+    for path in args.files:
+        graph = load_graph(path)
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), deadline(args.time_budget):
+                pairs = planner.solve(graph.num_vertices, graph.edges)
+            failure = None if is_matching(graph.edges, pairs) else "not a matching"
+        except (BudgetExceeded, MemoryError, RecursionError, ValueError) as e:
+            failure = f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - started
+        engines = sorted({plan.engine for plan in planner.history})
+        planner.history.clear()
+        print(f"{path}: engines={','.join(engines)} seconds={seconds:.3f} "
+              + (f"matched={len(pairs)}" if failure is None else f"failed with {failure}"))
+        failures += failure is not None
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
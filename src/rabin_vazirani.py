@@ -1,6 +1,13 @@
 import numpy
 from random import randint
 import numpy as np
+from modular_matrix import DEFAULT_PRIME, maximum_rank_vertices
+from graph_utils import induced_edges
+from bit_adjacency import BitAdjacency
+from wiedemann import sparse_has_perfect_matching, sparse_rank
+from sparse_lu import sparse_lu_has_perfect_matching, sparse_lu_matching, sparse_lu_rank
+from allowed_edges import AllowedEdgeReport
+from skew_factorization import skew_inverse, skew_rank
 
 class Graph:
     EDGE_EXISTS = 1
@@ -8,26 +15,28 @@ class Graph:
 
     def __init__(self, n):
         self.num_vertices = n
-        self.matrix = [[0]*n for i in range(n)]
-        
+        self.adjacency = BitAdjacency(n)
+
     def add_edge(self, i, j):
-        self.matrix[i][j] = self.EDGE_EXISTS
-        self.matrix[j][i] = self.EDGE_EXISTS
+        self.adjacency.add_edge(i, j)
+
+    def add_edges(self, edges):
+        self.adjacency.add_edges(edges)
 
     def determinant(self, matrix):
         return numpy.linalg.det(matrix)
 
     def get_val(self, i, j):
-        return "x" if self.matrix[i][j] == self.EDGE_EXISTS else "o"
+        return "x" if self.adjacency.has_edge(i, j) else "o"
 
     def print_graph(self):        
         print("  ", end=' ')
-        for i in range(len(self.matrix)):
+        for i in range(self.num_vertices):
             print(str(i).center(len(self.get_val(i, i))), end=' ')
         print()
-        for i in range(len(self.matrix)):
+        for i in range(self.num_vertices):
             print(i, end=' ')
-            for j in range(len(self.matrix)):
+            for j in range(self.num_vertices):
                 print(self.get_val(i, j), end=' ')
             print()
 
@@ -37,109 +46,145 @@ class TutteGraph(Graph):
     def __init__(self, n):
         super().__init__(n)
 
-    def add_edge(self, i, j):
-        self.matrix[i][j] = self.get_indeterminate(i, j)
-        self.matrix[j][i] = self.get_indeterminate(j, i)
-    
     def get_indeterminate(self, i, j):
         val = self.BIG_NUM * i + j
         return val if i < j else -val
 
     def get_val(self, i, j):
-        val = abs(self.matrix[i][j])
-        if val > 0:
-            u = val // self.BIG_NUM
-            v = val % self.BIG_NUM
-        else:
-            u = i
-            v = j
-            
-        if self.matrix[i][j] > 0:
-            return "|  X(%2d, %2d)" % (u, v) 
-        elif self.matrix[i][j] < 0:
-            return "| -X(%2d, %2d)" % (v, u)
-        else:
+        if not self.adjacency.has_edge(i, j):
             return "|" + "0".center(11)
-        
-    def empty_matrix(self):
-        n = self.num_vertices
-        return [[0] * n for _ in range(n)]
+        if i < j:
+            return "|  X(%2d, %2d)" % (i, j)
+        return "| -X(%2d, %2d)" % (j, i)
 
     def get_adj_matrix(self):
-        matrix = self.empty_matrix()
-        for i in range(len(self.matrix)):
-            for j in range(len(self.matrix[i])):
-                matrix[i][j] = 1 if self.matrix[i][j] != 0 else 0
-        return matrix
+        return np.asarray(self.adjacency, dtype=int).tolist()
 
     def get_tutte_matrix(self, m=None):
         m = self.num_vertices**2 if m is None else m
-        matrix = self.empty_matrix()
-
-        for i in range(len(self.matrix)):
-            for j in range(i+1, len(self.matrix[i])):
-                if self.matrix[i][j] != 0:
-                    random_num = randint(1, m)
-                    matrix[i][j] = random_num
-                    matrix[j][i] = -random_num
+        rows, cols = self.get_edge_arrays()
+        matrix = np.zeros((self.num_vertices, self.num_vertices), dtype=np.int64)
+        values = np.array([randint(1, m) for _ in range(len(rows))], dtype=np.int64)
+        matrix[rows, cols] = values
+        matrix[cols, rows] = -values
         return matrix
 
-    def rand_has_perfect_matching(self, times=1):
+    def rand_has_perfect_matching(self, times=1, oracle=None):
+        if oracle is not None:
+            return oracle.has_perfect_matching(self, times)
         for _ in range(times):
-            result = round(abs(np.linalg.det(self.get_tutte_matrix())), 10) > 0
+            result = skew_rank(self.get_tutte_matrix()) == self.num_vertices
             if result:
                 return True
         return False
 
-    def empty(self, graph_matrix):
-        for row in graph_matrix:
-            for value in row:
-                if value == 1:
-                    return False
-        return True
+    def get_edges(self):
+        return [(int(i), int(j)) for i, j in self.adjacency.edges()]
+
+    def sparse_has_perfect_matching(self, times=1, prime=DEFAULT_PRIME):
+        return sparse_has_perfect_matching(self.num_vertices, self.get_edges(), prime, trials=times)
+
+    def sparse_rank(self, prime=DEFAULT_PRIME):
+        return sparse_rank(self.num_vertices, self.get_edges(), prime)
+
+    def sparse_lu_has_perfect_matching(self, prime=DEFAULT_PRIME):
+        return sparse_lu_has_perfect_matching(self.num_vertices, self.get_edges(), prime)
+
+    def sparse_lu_rank(self, prime=DEFAULT_PRIME):
+        return sparse_lu_rank(self.num_vertices, self.get_edges(), prime)
+
+    def get_sparse_max_matching(self, prime=DEFAULT_PRIME):
+        return sparse_lu_matching(self.num_vertices, self.get_edges(), prime)
+
+    def allowed_edges(self, prime=DEFAULT_PRIME):
+        edges = self.get_edges()
+        mask = AllowedEdgeReport(self.num_vertices, edges, prime).allowed_mask()
+        return [edge for edge, allowed in zip(edges, mask) if allowed]
+
+    def increases_matching(self, pairs, prime=DEFAULT_PRIME):
+        return AllowedEdgeReport(self.num_vertices, self.get_edges(), prime).increases_matching(pairs)
+
+    def get_edge_arrays(self):
+        edges = self.adjacency.edges()
+        return edges[:, 0], edges[:, 1]
+
+    def empty(self, alive):
+        return not alive.any()
 
     def inverse(self, matrix):
-        return np.linalg.inv(matrix)
+        return skew_inverse(matrix)
 
-    def find_next_edge(self, graph_matrix, inv_tutte_matrix):
-        for i in range(len(graph_matrix)):
-            for j in range(len(graph_matrix[i])):
-                if graph_matrix[i][j] == 1 and round(inv_tutte_matrix[i][j], 10) != 0:
-                    return (i, j)
-        return None
+    def find_next_edge(self, rows, cols, alive, inv_tutte_matrix):
+        candidates = np.flatnonzero(alive)
+        values = np.asarray(inv_tutte_matrix)[rows[candidates], cols[candidates]]
+        allowed = candidates[np.round(values, 10) != 0]
+        if len(allowed) == 0:
+            return None
+        return (int(rows[allowed[0]]), int(cols[allowed[0]]))
 
-    def delete_edge(self, graph_matrix, edge):
+    def delete_edge(self, rows, cols, alive, edge):
         u, v = edge
-        for i in range(len(self.matrix)):
-            graph_matrix[u][i] = 0
-            graph_matrix[i][u] = 0
-            graph_matrix[v][i] = 0
-            graph_matrix[i][v] = 0
+        alive &= (rows != u) & (rows != v) & (cols != u) & (cols != v)
 
     def rank(self, matrix):
-        return np.linalg.matrix_rank(matrix)
+        return skew_rank(matrix)
+
+    def max_rank_vertices(self):
+        edges = np.column_stack(self.get_edge_arrays())
+        return maximum_rank_vertices(self.num_vertices, edges, DEFAULT_PRIME)
+
+    def induced_subgraph(self, vertices):
+        subgraph = TutteGraph(len(vertices))
+        edges = np.column_stack(self.get_edge_arrays())
+        subgraph.add_edges(induced_edges(edges, vertices, self.num_vertices))
+        return subgraph
 
     def get_max_matching(self):
+        vertices = self.max_rank_vertices()
+        if len(vertices) == 0:
+            return []
+        if len(vertices) < self.num_vertices:
+            matching = self.induced_subgraph(vertices).get_max_matching()
+            return [(int(vertices[i]), int(vertices[j])) for i, j in matching]
         max_matching = []
-        graph_matrix = self.get_adj_matrix()
-        print(self.rank(self.matrix))
-        while not self.empty(graph_matrix):
-            tutte_matrix = self.get_tutte_matrix()
-            try:
-                inv_tutte_matrix = self.inverse(tutte_matrix)
-            except np.linalg.LinAlgError:
-                return "This graph does not have a perfect matching"
-
-            new_edge = self.find_next_edge(graph_matrix, inv_tutte_matrix)
+        rows, cols = self.get_edge_arrays()
+        alive = np.ones(len(rows), dtype=bool)
+        remaining = np.arange(self.num_vertices)
+        # One instantiation serves every step: the Tutte matrix of the remaining
+        # graph is its submatrix on the remaining vertices.
+        tutte_matrix = self.get_tutte_matrix()
+        inv_tutte_matrix = np.zeros((self.num_vertices, self.num_vertices))
+        retry_limit = 10
+        while not self.empty(alive):
+            for attempt in range(retry_limit):
+                try:
+                    inverse = self.inverse(tutte_matrix[np.ix_(remaining, remaining)])
+                    break
+                except np.linalg.LinAlgError:
+                    # The remaining graph has a perfect matching, so a singular
+                    # submatrix is an unlucky instantiation: draw a new one.
+                    tutte_matrix = self.get_tutte_matrix()
+            else:
+                raise np.linalg.LinAlgError("Unable to compute non-singular inverse after several attempts")
+            # Entries outside the remaining vertices are stale, but no alive edge reads them.
+            inv_tutte_matrix[np.ix_(remaining, remaining)] = inverse
+
+            new_edge = self.find_next_edge(rows, cols, alive, inv_tutte_matrix)
             if new_edge is None:
                 break
             i, j = new_edge
                 
             max_matching.append(new_edge)
-            self.delete_edge(graph_matrix, new_edge)
+            self.delete_edge(rows, cols, alive, new_edge)
+            remaining = remaining[(remaining != i) & (remaining != j)]
 
         return max_matching
     
+def solve(num_vertices, edges):
+    graph = TutteGraph(num_vertices)
+    graph.add_edges(edges)
+    return graph.get_max_matching()
+
 def main():
     g1 = TutteGraph(3)
     g1.add_edge(0, 1)
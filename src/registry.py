@@ -0,0 +1,33 @@
+import importlib
+
+ENGINE_MODULES = {
+    "rabin-vazirani": "rabin_vazirani",
+    "mucha-sankowski-general": "mucha_sankowski_general",
+    "mucha-sankowski-bipartite": "mucha_sankowski_bipartite",
+    "harvey": "harvey",
+    "bentert-heeger-koana": "bentert_heeger_koana",
+    "edmonds-blossom": "edmonds_blossom",
+    "sparse-lu": "sparse_lu",
+    "hybrid": "hybrid_matching",
+}
+
+
+def available_engines():
+    return sorted(ENGINE_MODULES) + ["auto"]
+
+
+def solve_auto(num_vertices, edges):
+    from planner import Planner
+    return Planner().solve(num_vertices, edges)
+
+
+def get_engine(name):
+    if name == "auto":
+        return solve_auto
+    if name not in ENGINE_MODULES:
+        raise ValueError(f"Unknown engine {name!r}, expected one of {available_engines()}")
+    return importlib.import_module(ENGINE_MODULES[name]).solve
+
+
+def solve(name, num_vertices, edges):
+    return get_engine(name)(num_vertices, [(int(u), int(v)) for u, v in edges])
@@ -0,0 +1,118 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+# Segments attached in this process, kept open so the views handed out stay valid.
+_attached = {}
+
+
+class SharedArray:
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+
+    def attach(self):
+        if self.name not in _attached:
+            # Pool workers share the publisher's resource tracker, so the
+            # registration made here does not outlive the publisher's unlink.
+            segment = shared_memory.SharedMemory(name=self.name)
+            _attached[self.name] = segment
+        view = np.ndarray(self.shape, dtype=self.dtype, buffer=_attached[self.name].buf)
+        view.flags.writeable = False
+        return view
+
+
+def detach(handle):
+    segment = _attached.pop(handle.name, None)
+    if segment is not None:
+        segment.close()
+
+
+class SharedArena:
+    def __init__(self):
+        self.segments = []
+
+    def publish(self, array):
+        array = np.ascontiguousarray(array)
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+        self.segments.append(segment)
+        return SharedArray(segment.name, array.shape, array.dtype)
+
+    def nbytes(self):
+        return sum(segment.size for segment in self.segments)
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+class SharedGraph:
+    def __init__(self, num_vertices, order, offsets, edges, edge_offsets, matrix=None):
+        self.num_vertices = num_vertices
+        self.order = order
+        self.offsets = offsets
+        self.edges = edges
+        self.edge_offsets = edge_offsets
+        self.matrix = matrix
+
+    @classmethod
+    def publish(cls, arena, num_vertices, edges, components=None, matrix=None):
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        if components is None:
+            components = [np.arange(num_vertices)]
+        components = [np.sort(component) for component in components]
+        labels = np.full(num_vertices, -1, dtype=np.int64)
+        for label, component in enumerate(components):
+            labels[component] = label
+        # Edges are grouped by component so a worker reads only its own slice.
+        edge_labels = labels[edges[:, 0]]
+        edges = edges[edge_labels >= 0]
+        edge_labels = edge_labels[edge_labels >= 0]
+        grouping = np.argsort(edge_labels, kind="stable")
+        edge_offsets = np.searchsorted(edge_labels[grouping], np.arange(len(components) + 1))
+        order = np.concatenate(components) if components else np.empty(0, dtype=np.int64)
+        offsets = np.cumsum([0] + [len(component) for component in components])
+        return cls(
+            num_vertices,
+            arena.publish(order.astype(np.int64)),
+            arena.publish(offsets.astype(np.int64)),
+            arena.publish(edges[grouping]),
+            arena.publish(edge_offsets.astype(np.int64)),
+            None if matrix is None else arena.publish(matrix),
+        )
+
+    def num_components(self):
+        return self.offsets.shape[0] - 1
+
+    def component(self, index):
+        offsets = self.offsets.attach()
+        return self.order.attach()[offsets[index]:offsets[index + 1]]
+
+    def component_edges(self, index):
+        # Edges of the component renumbered to positions in component(index).
+        offsets = self.edge_offsets.attach()
+        edges = self.edges.attach()[offsets[index]:offsets[index + 1]]
+        return np.searchsorted(self.component(index), edges)
+
+    def get_edges(self):
+        return self.edges.attach()
+
+    def get_matrix(self):
+        return None if self.matrix is None else self.matrix.attach()
+
+    def detach(self):
+        for handle in (self.order, self.offsets, self.edges, self.edge_offsets, self.matrix):
+            if handle is not None:
+                detach(handle)
@@ -0,0 +1,208 @@
+import numpy as np
+from modular_matrix import BLOCK_SIZE, check_prime, cycles, mod_inv, mod_inverse, mod_matmul, reduce
+
+# For ranks, a floating-point pivot below this fraction of the largest input
+# entry counts as zero. Inverses use plain partial pivoting by default, like
+# np.linalg.inv: Tutte matrices of long paths are nonsingular but badly
+# conditioned, and a relative cutoff would reject them.
+RELATIVE_TOLERANCE = 1e-10
+TILE_SIZE = 256
+
+
+def product(A, B, p=None):
+    return A @ B if p is None else mod_matmul(A, B, p)
+
+
+def negate(values, p=None):
+    return -values if p is None else (p - values) % p
+
+
+def add_skew_product(A, left, right, p=None, start=0, lower=True, tile_size=TILE_SIZE):
+    # A += left @ right for a product known to be skew-symmetric. Only the
+    # block upper triangle is multiplied, about half the flops; the lower
+    # triangle, when kept, gets the negated transpose of each block, so A
+    # stays exactly skew-symmetric in floating point too.
+    n = A.shape[0]
+    for i in range(start, n, tile_size):
+        e = min(i + tile_size, n)
+        block = product(left[i:e], right[:, i:], p)
+        block[:, :e - i] = np.triu(block[:, :e - i], 1)
+        if lower:
+            block[:, :e - i] += negate(block[:, :e - i], p).T
+            A[e:, i:e] += negate(block[:, e - i:], p).T
+            if p is not None:
+                A[e:, i:e] %= p
+        A[i:e, i:] += block
+        if p is not None:
+            A[i:e, i:] %= p
+
+
+def mirror_upper(A, p=None, tile_size=TILE_SIZE):
+    n = A.shape[0]
+    for i in range(0, n, tile_size):
+        e = min(i + tile_size, n)
+        A[i:e, i:e] = np.triu(A[i:e, i:e], 1)
+        A[i:e, i:e] += negate(A[i:e, i:e], p).T
+        A[e:, i:e] = negate(A[i:e, e:], p).T
+    return A
+
+
+def abs_max(A, tile_size=TILE_SIZE):
+    return max(float(np.abs(A[i:i + tile_size]).max()) for i in range(0, A.shape[0], tile_size))
+
+
+def upper_row(A, r, p=None):
+    # A full row of a skew-symmetric matrix held in its upper triangle.
+    row = A[r].copy()
+    row[:r] = negate(A[:r, r], p)
+    row[r] = 0
+    return row
+
+
+def set_upper_rows(A, rows, values, p=None):
+    for t, r in enumerate(rows):
+        A[r, r + 1:] = values[t, r + 1:]
+        A[:r, r] = negate(values[t, :r], p)
+        A[r, r] = 0
+
+
+class SkewFactorization:
+    # Blocked elimination of a skew-symmetric matrix with 2 x 2 pivots
+    # [[0, a], [-a, 0]], Bunch's skew analogue of LDL^T: for the pivot order
+    # P, P^T A P = L D L^T. The work array is the one reduced copy of A, and
+    # only its upper triangle is read or written; the lower triangle is left
+    # as it was until inverse() mirrors the result into it. Eliminating (u, v) adds (y x^T - x y^T) / a, where x and y
+    # are the current columns u and v, so within a panel a row is its stored
+    # value plus a rank-2k correction, and the panel reaches the rest of the
+    # matrix as one rank-2k product on the upper tiles.
+    def __init__(self, A, p=None, block_size=BLOCK_SIZE, tolerance=None):
+        if p is not None:
+            check_prime(p)
+            A = reduce(A, p)
+        else:
+            A = np.array(A, dtype=float)
+        self.prime = p
+        self.size = A.shape[0]
+        self.work = A
+        self.pairs_per_panel = max(1, block_size // 2)
+        self.threshold = 0 if p is not None or tolerance is None or self.size == 0 else tolerance * abs_max(A)
+        self.pairs = []
+        self.values = []
+        self.deficient = []
+        self.swept = np.zeros(self.size, dtype=bool)
+
+    def current_row(self, x, P, Q):
+        p = self.prime
+        stored = upper_row(self.work, x, p)
+        if len(P) == 0:
+            return stored, stored.copy()
+        if p is None:
+            return stored, stored + P[:, x] @ Q - Q[:, x] @ P
+        return stored, (stored + (P[:, x] @ Q) % p - (Q[:, x] @ P) % p) % p
+
+    def factor(self, jordan=False, stop_at_deficiency=False):
+        # With jordan=True every panel is also swept out of the rows and
+        # columns of earlier pivots (Gauss-Jordan). A sweep leaves the blocks
+        # between swept and unswept vertices symmetric rather than skew, so
+        # the rows of swept vertices are kept negated: the work matrix stays
+        # skew-symmetric, every sweep is the ordinary Schur update on it, and
+        # the end result is A^-1 itself.
+        p = self.prime
+        n = self.size
+        while not self.swept.all():
+            P = np.zeros((self.pairs_per_panel, n), dtype=self.work.dtype)
+            Q = np.zeros_like(P)
+            panel, stored = [], []
+            free = ~self.swept
+            k = 0
+            while k < self.pairs_per_panel:
+                candidates = np.flatnonzero(free)
+                if len(candidates) == 0:
+                    break
+                u = int(candidates[0])
+                free[u] = False
+                stored_u, row_u = self.current_row(u, P[:k], Q[:k])
+                partners = candidates[1:][np.abs(row_u[candidates[1:]]) > self.threshold]
+                if len(partners) == 0:
+                    if jordan:
+                        raise np.linalg.LinAlgError("Singular skew-symmetric matrix")
+                    self.deficient.append(u)
+                    self.swept[u] = True
+                    if stop_at_deficiency:
+                        return self
+                    continue
+                v = int(partners[np.argmax(np.abs(row_u[partners]))] if p is None else partners[0])
+                free[v] = False
+                stored_v, row_v = self.current_row(v, P[:k], Q[:k])
+                a = row_u[v]
+                # P[k] is the current column v over a, Q[k] the current column u.
+                P[k] = -row_v / a if p is None else negate(row_v, p) * mod_inverse(a, p) % p
+                Q[k] = negate(row_u, p)
+                self.pairs.append((u, v))
+                self.values.append(a)
+                panel += [u, v]
+                stored += [stored_u, stored_v]
+                k += 1
+            if k:
+                self.apply(panel, np.array(stored), P[:k], Q[:k], jordan)
+        return self
+
+    def apply(self, panel, stored, P, Q, jordan):
+        p = self.prime
+        self.swept[panel] = True
+        if not jordan and self.swept.all():
+            return
+        start = 0 if jordan else int(np.argmin(self.swept))
+        left = np.concatenate([P, Q]).T
+        right = np.concatenate([Q, negate(P, p)])
+        add_skew_product(self.work, left, right, p, start, lower=False)
+        if jordan:
+            # The negated panel rows become -K^-1 A[K, rest] and K^-1.
+            core = stored[:, panel]
+            core_inverse = np.linalg.inv(core) if p is None else mod_inv(core, p)
+            stored[:, panel] = 0
+            rows = negate(product(core_inverse, stored, p), p)
+            rows[:, panel] = core_inverse
+            set_upper_rows(self.work, panel, rows, p)
+
+    def rank(self):
+        return 2 * len(self.pairs)
+
+    def pivot_vertices(self):
+        return np.sort(np.array([w for pair in self.pairs for w in pair], dtype=np.int64))
+
+    def pfaffian(self):
+        # Pf(P^T A P) = det(P) Pf(A), and the pivots of P^T A P sit at
+        # (0, 1), (2, 3), ..., where Pf is just their product.
+        p = self.prime
+        if self.rank() < self.size:
+            return 0
+        order = np.array([w for pair in self.pairs for w in pair], dtype=np.int64)
+        odd = (self.size - len(cycles(order))) % 2
+        if p is None:
+            value = float(np.prod(self.values)) if self.values else 1.0
+            return -value if odd else value
+        value = 1
+        for a in self.values:
+            value = value * int(a) % p
+        return (p - value) % p if odd else value
+
+    def inverse(self):
+        self.factor(jordan=True)
+        return mirror_upper(self.work, self.prime)
+
+
+def skew_rank(A, p=None, tolerance=RELATIVE_TOLERANCE):
+    return SkewFactorization(A, p, tolerance=tolerance).factor().rank()
+
+
+def skew_pfaffian(A, p=None, tolerance=None):
+    return SkewFactorization(A, p, tolerance=tolerance).factor(stop_at_deficiency=True).pfaffian()
+
+
+def skew_pivot_vertices(A, p=None, tolerance=RELATIVE_TOLERANCE):
+    return SkewFactorization(A, p, tolerance=tolerance).factor().pivot_vertices()
+
+
+def skew_inverse(A, p=None, block_size=BLOCK_SIZE, tolerance=None):
+    return SkewFactorization(A, p, block_size, tolerance).inverse()
@@ -0,0 +1,270 @@
+import heapq
+import warnings
+import numpy as np
+from modular_matrix import DEFAULT_PRIME, mod_inverse
+from graph_utils import bfs_levels, core_numbers, induced_edges, to_csr
+
+# Dense elimination does an update about this many times faster than the
+# dict-based one, so solve() leaves graphs whose symbolic work exceeds
+# n^3 / DENSE_SPEEDUP to FALLBACK_ENGINE, whose memory stays linear.
+DENSE_SPEEDUP = 1000
+FALLBACK_ENGINE = "hybrid"
+# envelope_work() is an upper bound that the minimum degree ordering usually
+# beats by orders of magnitude, so the symbolic phase is only skipped when
+# the bound exceeds the work limit this many times over.
+ENVELOPE_SLACK = 100
+
+
+# A skew-symmetric matrix has a zero diagonal, so it is factored with 2 x 2
+# pivots [[0, a], [-a, 0]], each eliminating an edge (u, v) with A[u, v] = a.
+# Eliminating (u, v) only couples the remaining neighbours of u with those of
+# v, so the fill it creates is the biclique between the two neighbourhoods.
+class SymbolicFactorization:
+    def __init__(self, num_vertices, pairs, deficient, fill, work):
+        self.num_vertices = num_vertices
+        self.pairs = pairs
+        self.deficient = deficient
+        self.fill = fill
+        self.work = work
+
+    def structural_rank(self):
+        return 2 * len(self.pairs)
+
+    def partners(self):
+        partner = np.full(self.num_vertices, -1, dtype=np.int64)
+        for u, v in self.pairs:
+            partner[u] = v
+            partner[v] = u
+        return partner
+
+
+def adjacency_sets(num_vertices, edges):
+    adjacency = [set() for _ in range(num_vertices)]
+    for u, v in np.asarray(edges, dtype=np.int64).reshape(-1, 2).tolist():
+        if u != v:
+            adjacency[u].add(v)
+            adjacency[v].add(u)
+    return adjacency
+
+
+def symbolic_factorization(num_vertices, edges, work_limit=None):
+    # Minimum degree ordering on the pivot-pair elimination graph: the vertex
+    # of least current degree is paired with its neighbour of least degree,
+    # and the biclique fill of that pair is added before the next choice.
+    adjacency = adjacency_sets(num_vertices, edges)
+    heap = [(len(adjacency[v]), v) for v in range(num_vertices)]
+    heapq.heapify(heap)
+    eliminated = np.zeros(num_vertices, dtype=bool)
+    pairs, deficient = [], []
+    fill = work = 0
+    while heap:
+        degree, u = heapq.heappop(heap)
+        if eliminated[u] or degree != len(adjacency[u]):
+            continue
+        eliminated[u] = True
+        if degree == 0:
+            deficient.append(u)
+            continue
+        v = min(adjacency[u], key=lambda x: (len(adjacency[x]), x))
+        eliminated[v] = True
+        pairs.append((u, v))
+        near_u, near_v = adjacency[u] - {v}, adjacency[v] - {u}
+        work += 2 * len(near_u) * len(near_v)
+        for x in near_u | near_v:
+            adjacency[x].discard(u)
+            adjacency[x].discard(v)
+        for x in near_v:
+            before = len(adjacency[x])
+            adjacency[x] |= near_u - {x}
+            fill += len(adjacency[x]) - before
+        for x in near_u:
+            before = len(adjacency[x])
+            adjacency[x] |= near_v - {x}
+            fill += len(adjacency[x]) - before
+        if work_limit is not None and work > work_limit:
+            raise ValueError(f"Elimination needs more than {work_limit} updates after {len(pairs)} pivots")
+        for x in near_u | near_v:
+            heapq.heappush(heap, (len(adjacency[x]), x))
+        adjacency[u] = adjacency[v] = set()
+    return SymbolicFactorization(num_vertices, pairs, deficient, fill, work)
+
+
+def envelope_work(num_vertices, edges):
+    # Eliminating a graph level by level in breadth-first order only creates
+    # fill within a level and towards the next one, so a level of width w
+    # followed by one of width w' costs at most w (w + w')^2 updates. Trees
+    # hanging off the 2-core are eliminated without fill and are left out.
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = np.unique(np.sort(edges[edges[:, 0] != edges[:, 1]], axis=1), axis=0)
+    if len(edges) == 0:
+        return 0.0
+    core = core_numbers(num_vertices, *to_csr(num_vertices, edges))
+    vertices = np.flatnonzero(core >= 2)
+    if len(vertices) == 0:
+        return 0.0
+    levels, labels, _ = bfs_levels(len(vertices), induced_edges(edges, vertices, num_vertices))
+    # One slot per (component, level), with an empty slot after each
+    # component's deepest level.
+    widths = np.bincount(labels * (int(levels.max()) + 2) + levels).astype(float)
+    following = np.append(widths[1:], 0.0)
+    return float(np.sum(widths * (widths + following) ** 2))
+
+
+class SparseSkewLU:
+    def __init__(self, num_vertices, edges, p=DEFAULT_PRIME, rng=None, symbolic=None):
+        rng = np.random.default_rng() if rng is None else rng
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        self.num_vertices = num_vertices
+        self.prime = p
+        self.symbolic = symbolic_factorization(num_vertices, edges) if symbolic is None else symbolic
+        self.rows = [{} for _ in range(num_vertices)]
+        for (u, v), value in zip(edges.tolist(), rng.integers(1, p, len(edges)).tolist()):
+            self.rows[u][v] = value
+            self.rows[v][u] = p - value
+        self.pivots = []
+        self.deficient = []
+        self.factors = []
+
+    def factor(self, stop_at_deficiency=False):
+        # Follows the symbolic pairing; a planned pivot that vanished
+        # numerically (or lost its partner) falls back to the lightest
+        # nonzero entry in its row, and a zero row is rank deficient.
+        partner = self.symbolic.partners()
+        order = [w for pair in self.symbolic.pairs for w in pair] + self.symbolic.deficient
+        for u in order:
+            row = self.rows[u]
+            if row is None:
+                continue
+            v = int(partner[u])
+            if v == -1 or row.get(v, 0) == 0:
+                if not row:
+                    self.deficient.append(u)
+                    self.rows[u] = None
+                    if stop_at_deficiency:
+                        return self
+                    continue
+                v = min(row, key=lambda x: (len(self.rows[x]), x))
+            self.eliminate(u, v)
+        return self
+
+    def eliminate(self, u, v):
+        p = self.prime
+        rows = self.rows
+        row_u, row_v = rows[u], rows[v]
+        a = row_u.pop(v)
+        del row_v[u]
+        inverse = mod_inverse(a, p)
+        for x in row_u:
+            del rows[x][u]
+        for x in row_v:
+            del rows[x][v]
+        # S[x, y] = A[x, y] - (A[x, v] A[u, y] - A[x, u] A[v, y]) / a
+        for near, far, sign in ((row_v, row_u, -1), (row_u, row_v, 1)):
+            for x, value in near.items():
+                scale = sign * (p - value) * inverse % p
+                target = rows[x]
+                for y, entry in far.items():
+                    if y != x:
+                        updated = (target.get(y, 0) + scale * entry) % p
+                        if updated:
+                            target[y] = updated
+                        else:
+                            target.pop(y, None)
+        self.pivots.append((u, v, a))
+        self.factors.append((row_u, row_v))
+        rows[u] = rows[v] = None
+
+    def rank(self):
+        return 2 * len(self.pivots)
+
+    def nonzeros(self):
+        return sum(len(row_u) + len(row_v) + 2 for row_u, row_v in self.factors)
+
+    def pivot_vertices(self):
+        # Pivot entries depend only on the rows and columns of earlier pivots,
+        # so the pivoted vertices index a nonsingular principal submatrix.
+        return np.sort(np.array([w for u, v, _ in self.pivots for w in (u, v)], dtype=np.int64))
+
+
+def sparse_lu_rank(num_vertices, edges, p=DEFAULT_PRIME, rng=None, symbolic=None):
+    return SparseSkewLU(num_vertices, edges, p, rng, symbolic).factor().rank()
+
+
+def sparse_lu_has_perfect_matching(num_vertices, edges, p=DEFAULT_PRIME, rng=None, symbolic=None):
+    if num_vertices % 2:
+        return False
+    lu = SparseSkewLU(num_vertices, edges, p, rng, symbolic).factor(stop_at_deficiency=True)
+    return not lu.deficient
+
+
+def sparse_maximum_rank_vertices(num_vertices, edges, p=DEFAULT_PRIME, rng=None):
+    return SparseSkewLU(num_vertices, edges, p, rng).factor().pivot_vertices()
+
+
+def component_of(adjacency, start):
+    seen = {start}
+    frontier = [start]
+    while frontier:
+        x = frontier.pop()
+        for y in adjacency[x]:
+            if y not in seen:
+                seen.add(y)
+                frontier.append(y)
+    return seen
+
+
+def sparse_lu_matching(num_vertices, edges, p=DEFAULT_PRIME, rng=None):
+    # Rank-based Rabin-Vazirani: an edge (u, v) is in a perfect matching exactly
+    # when G - u - v still has one. Only the component of u changes, so each
+    # test is one sparse factorization of that component without u and v,
+    # trying the symbolic partner of u first. Vertices are taken by current
+    # degree, and a vertex with a single neighbour needs no test at all.
+    rng = np.random.default_rng() if rng is None else rng
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    vertices = sparse_maximum_rank_vertices(num_vertices, edges, p, rng)
+    local = induced_edges(edges, vertices, num_vertices)
+    size = len(vertices)
+    adjacency = adjacency_sets(size, local)
+    partner = symbolic_factorization(size, local).partners()
+    heap = [(len(adjacency[u]), u) for u in range(size)]
+    heapq.heapify(heap)
+    matching = []
+    while heap:
+        degree, u = heapq.heappop(heap)
+        if degree != len(adjacency[u]) or degree == 0:
+            continue
+        candidates = sorted(adjacency[u], key=lambda x: (x != partner[u], len(adjacency[x]), x))
+        if degree > 1:
+            component = component_of(adjacency, u)
+            for v in candidates:
+                inside = np.array(sorted(component - {u, v}), dtype=np.int64)
+                if sparse_lu_has_perfect_matching(len(inside), induced_edges(local, inside, size), p, rng):
+                    break
+            else:
+                raise np.linalg.LinAlgError(f"No allowed edge at vertex {u} of a graph with a perfect matching")
+        else:
+            v = candidates[0]
+        matching.append((u, v))
+        for w in (u, v):
+            for x in adjacency[w]:
+                adjacency[x].discard(w)
+                heapq.heappush(heap, (len(adjacency[x]), x))
+            adjacency[w] = set()
+    return [(int(vertices[u]), int(vertices[v])) for u, v in matching]
+
+
+def solve(num_vertices, edges):
+    from registry import get_engine
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    work_limit = num_vertices ** 3 // DENSE_SPEEDUP
+    bound = envelope_work(num_vertices, edges)
+    if bound > ENVELOPE_SLACK * work_limit:
+        warnings.warn(f"Elimination bound of {bound:.3g} updates exceeds {ENVELOPE_SLACK} x {work_limit}, using {FALLBACK_ENGINE}")
+        return get_engine(FALLBACK_ENGINE)(num_vertices, edges)
+    try:
+        symbolic_factorization(num_vertices, edges, work_limit)
+    except ValueError as e:
+        warnings.warn(f"{e}, using {FALLBACK_ENGINE}")
+        return get_engine(FALLBACK_ENGINE)(num_vertices, edges)
+    return sparse_lu_matching(num_vertices, edges)
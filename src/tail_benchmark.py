@@ -0,0 +1,268 @@
+import argparse
+import contextlib
+import io
+import json
+import signal
+import sys
+import time
+import tracemalloc
+import numpy as np
+from planner import is_maximum
+from registry import available_engines, get_engine
+
+# A run longer than this many seconds, a probe run whose peak traced
+# allocation exceeds this many megabytes, or any result that is not a maximum
+# matching fails the benchmark.
+TIME_BUDGET = 10.0
+MEMORY_BUDGET = 1024.0
+REPEATS = 10
+# The probe run is slowed down by the profiler and tracemalloc, so it gets
+# this many time budgets before it is abandoned.
+PROBE_SLOWDOWN = 10
+# Lines the engines print when they throw away work and start again.
+RETRY_MESSAGES = (
+    "Singular matrix encountered",
+    "Singular augmented Tutte matrix",
+    "Floating-point matching fell short",
+    "Error encountered for k=",
+    "Failed to update inverse",
+)
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    # SIGALRM interrupts the engine at its next bytecode, so this only works
+    # in the main thread of a Unix process.
+    def expire(signum, frame):
+        raise BudgetExceeded(f"over the {seconds:g}s budget")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def odd_cycle(num_vertices, rng):
+    # One blossom spanning the whole graph.
+    n = num_vertices | 1
+    return n, np.column_stack([np.arange(n), (np.arange(n) + 1) % n])
+
+
+def nested_blossoms(num_vertices, rng):
+    # Triangle k is (x_k, b_k, b_{k-1}): each blossom's base sits on the next
+    # triangle, so the search contracts blossoms inside blossoms, one level
+    # of Graph.contract recursion per triangle.
+    levels = max(1, (num_vertices - 1) // 2)
+    x = 1 + 2 * np.arange(levels)
+    b = x + 1
+    previous = np.concatenate([[0], b[:-1]])
+    edges = np.concatenate([np.column_stack([b, x]), np.column_stack([x, previous]), np.column_stack([b, previous])])
+    return 2 * levels + 1, edges
+
+
+def long_path(num_vertices, rng):
+    # A unique perfect matching: the Tutte inverse entries are products of
+    # ratios along the path and spread over many orders of magnitude, so
+    # floating-point instantiations are near-singular.
+    n = max(2, num_vertices - num_vertices % 2)
+    return n, np.column_stack([np.arange(n - 1), np.arange(1, n)])
+
+
+def cubic_expander(num_vertices, rng):
+    # Random 3-regular graphs are expanders with high probability, with no
+    # separator of size o(n) for find_k_separator to find.
+    n = max(4, num_vertices + num_vertices % 2)
+    while True:
+        edges = np.sort(rng.permutation(np.repeat(np.arange(n), 3)).reshape(-1, 2), axis=1)
+        if (edges[:, 0] != edges[:, 1]).all() and len(np.unique(edges, axis=0)) == len(edges):
+            return n, edges
+
+
+FAMILIES = {
+    "odd-cycle": (odd_cycle, ("edmonds-blossom", "hybrid"), (65, 129, 257, 513)),
+    "nested-blossoms": (nested_blossoms, ("edmonds-blossom", "hybrid"), (33, 65, 129, 257)),
+    "long-path": (long_path, ("harvey", "rabin-vazirani", "mucha-sankowski-general"), (32, 64, 128, 256)),
+    "cubic-expander": (cubic_expander, ("bentert-heeger-koana",), (6, 8, 10, 12)),
+}
+
+
+def instance(family, num_vertices, rng):
+    # Vertex labels are shuffled so that repeats see different search orders.
+    n, edges = FAMILIES[family][0](num_vertices, rng)
+    labels = rng.permutation(n)
+    return n, [(int(u), int(v)) for u, v in labels[edges]]
+
+
+def is_correct(num_vertices, edges, pairs):
+    # A failure string or a short matching is a wrong answer, however fast.
+    return isinstance(pairs, list) and is_maximum(num_vertices, np.asarray(edges, dtype=np.int64).reshape(-1, 2), pairs)
+
+
+def timed_run(engine, num_vertices, edges, time_budget):
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output), deadline(time_budget):
+        pairs = engine(num_vertices, edges)
+    seconds = time.perf_counter() - started
+    retries = sum(output.getvalue().count(message) for message in RETRY_MESSAGES)
+    return seconds, retries, is_correct(num_vertices, edges, pairs)
+
+
+def probe_run(engine, num_vertices, edges, time_budget):
+    # Recursion depth is the largest number of simultaneous frames of any one
+    # function, which covers Graph.contract recursion in edmonds_blossom and
+    # the divide and conquer in harvey alike.
+    active = {}
+    deepest = 0
+
+    def profile(frame, event, arg):
+        nonlocal deepest
+        if event == "call":
+            active[frame.f_code] = active.get(frame.f_code, 0) + 1
+            deepest = max(deepest, active[frame.f_code])
+        elif event == "return":
+            active[frame.f_code] = active.get(frame.f_code, 0) - 1
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), deadline(PROBE_SLOWDOWN * time_budget):
+            sys.setprofile(profile)
+            try:
+                pairs = engine(num_vertices, edges)
+            finally:
+                sys.setprofile(None)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return deepest, peak / 2 ** 20, is_correct(num_vertices, edges, pairs)
+
+
+class TailResult:
+    def __init__(self, family, engine, num_vertices, num_edges):
+        self.family = family
+        self.engine = engine
+        self.num_vertices = num_vertices
+        self.num_edges = num_edges
+        self.seconds = []
+        self.retries = []
+        self.wrong = 0
+        self.depth = None
+        self.peak_mb = None
+        self.failure = None
+
+    def percentile(self, q):
+        # A wrong answer never arrives, so it counts as an infinitely slow run;
+        # rounding up to an observed run keeps interpolation away from it.
+        seconds = self.seconds + [np.inf] * self.wrong
+        return float(np.percentile(seconds, q, method="higher")) if seconds else None
+
+    def record(self):
+        return {
+            "family": self.family,
+            "engine": self.engine,
+            "vertices": self.num_vertices,
+            "edges": self.num_edges,
+            "runs": len(self.seconds) + self.wrong,
+            "wrong": self.wrong,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "retries": sum(self.retries),
+            "max_retries": max(self.retries, default=0),
+            "depth": self.depth,
+            "peak_mb": self.peak_mb,
+            "failure": self.failure,
+        }
+
+    def describe(self):
+        def seconds(value):
+            if value is None or value == np.inf:
+                return "-" if value is None else "inf"
+            return f"{value:.4f}s"
+
+        return (
+            f"{self.family:16} {self.engine:24} n={self.num_vertices:<6} p50={seconds(self.percentile(50))} "
+            f"p99={seconds(self.percentile(99))} wrong={self.wrong} "
+            f"retries={sum(self.retries)} (max {max(self.retries, default=0)}) "
+            f"depth={'-' if self.depth is None else self.depth} "
+            f"peak={'-' if self.peak_mb is None else f'{self.peak_mb:.1f}MB'}"
+            + ("" if self.failure is None else f" FAILED: {self.failure}")
+        )
+
+
+def benchmark(family, engine_name, num_vertices, repeats=REPEATS, time_budget=TIME_BUDGET,
+              memory_budget=MEMORY_BUDGET, seed=0):
+    rng = np.random.default_rng(seed)
+    engine = get_engine(engine_name)
+    instances = [instance(family, num_vertices, rng) for _ in range(repeats)]
+    result = TailResult(family, engine_name, instances[0][0], len(instances[0][1]))
+    for n, edges in instances:
+        try:
+            seconds, retries, correct = timed_run(engine, n, edges, time_budget)
+        except Exception as e:
+            result.failure = f"{type(e).__name__}: {e}"
+            return result
+        result.retries.append(retries)
+        if correct:
+            result.seconds.append(seconds)
+        else:
+            result.wrong += 1
+    try:
+        result.depth, result.peak_mb, correct = probe_run(engine, *instances[-1], time_budget)
+        result.wrong += not correct
+    except BudgetExceeded:
+        print(f"{family} {engine_name} n={num_vertices}: probe run abandoned", file=sys.stderr)
+    if result.wrong:
+        result.failure = f"{result.wrong} results were not maximum matchings"
+    elif result.percentile(99) > time_budget:
+        result.failure = f"p99 over the {time_budget:g}s budget"
+    elif result.peak_mb is not None and result.peak_mb > memory_budget:
+        result.failure = f"peak {result.peak_mb:.1f}MB over the {memory_budget:g}MB budget"
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tail latency of the matching engines on adversarial graph families.")
+    parser.add_argument("--families", nargs="+", choices=sorted(FAMILIES), default=sorted(FAMILIES))
+    parser.add_argument("--engines", nargs="+", choices=available_engines(),
+                        help="engines to run on every family (default: the engines each family targets)")
+    parser.add_argument("--sizes", type=int, nargs="+", help="vertex counts (default: per family)")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="instances per family, engine and size")
+    parser.add_argument("--time-budget", type=float, default=TIME_BUDGET, help="seconds allowed per run")
+    parser.add_argument("--memory-budget", type=float, default=MEMORY_BUDGET, help="peak megabytes allowed per run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=argparse.FileType("w"), help="JSON lines destination")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    failures = 0
+    for family in args.families:
+        _, engines, sizes = FAMILIES[family]
+        for engine in args.engines or engines:
+            # Sizes increase, so an engine that failed at one size is not run
+            # on the larger ones.
+            for num_vertices in args.sizes or sizes:
+                result = benchmark(family, engine, num_vertices, args.repeats, args.time_budget,
+                                   args.memory_budget, args.seed)
+                print(result.describe(), flush=True)
+                if args.output:
+                    args.output.write(json.dumps(result.record()) + "\n")
+                    args.output.flush()
+                if result.failure is not None:
+                    failures += 1
+                    break
+    print(f"total: {failures} failed, {time.perf_counter() - started:.3f}s", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import os
+import tempfile
+import numpy as np
+from modular_matrix import eliminate_panel, mod_matmul
+
+
+def eliminate_float_panel(panel, start, pivots):
+    # The floating-point counterpart of modular_matrix.eliminate_panel, with
+    # partial pivoting on the largest entry.
+    for t in range(panel.shape[1]):
+        k = start + t
+        p = k + int(np.argmax(np.abs(panel[k:, t])))
+        if panel[p, t] == 0:
+            raise np.linalg.LinAlgError("Singular matrix")
+        if p != k:
+            panel[[k, p]] = panel[[p, k]]
+        pivots[k] = p
+        pivot = panel[k, t]
+        panel[k, t] = 1.0
+        panel[k] /= pivot
+        factors = panel[:, t].copy()
+        factors[k] = 0.0
+        panel[:, t] = 0.0
+        panel[k, t] = 1.0 / pivot
+        panel -= np.outer(factors, panel[k])
+
+
+class TiledMatrix:
+    DEFAULT_TILE_SIZE = 256
+
+    def __init__(self, n, tile_size=DEFAULT_TILE_SIZE, directory=None, prime=None):
+        self.size = n
+        # With a prime the tiles hold int64 residues and every product goes
+        # through mod_matmul, so the tiled inverse is exact.
+        self.prime = prime
+        self.tile_size = tile_size
+        self.num_tiles = max(1, -(-n // tile_size))
+        self.padded_size = self.num_tiles * tile_size
+        fd, self.path = tempfile.mkstemp(suffix=".tiles", dir=directory)
+        os.close(fd)
+        shape = (self.num_tiles, self.num_tiles, tile_size, tile_size)
+        self.tiles = np.memmap(self.path, dtype=float if prime is None else np.int64, mode="w+", shape=shape)
+        # The padding is an identity block, so the padded matrix is invertible
+        # exactly when the original one is and its inverse is diag(A^-1, I).
+        padding = np.arange(n, self.padded_size)
+        self.tiles[padding // tile_size, padding // tile_size, padding % tile_size, padding % tile_size] = 1.0
+
+    @classmethod
+    def from_entries(cls, n, rows, cols, values, tile_size=DEFAULT_TILE_SIZE, directory=None, prime=None):
+        matrix = cls(n, tile_size, directory, prime)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        b = tile_size
+        matrix.tiles[rows // b, cols // b, rows % b, cols % b] = values
+        return matrix
+
+    def close(self):
+        if self.tiles is not None:
+            self.tiles._mmap.close()
+            self.tiles = None
+            os.remove(self.path)
+
+    def __del__(self):
+        try:
+            self.close()
+        except (AttributeError, OSError):
+            pass
+
+    @property
+    def shape(self):
+        return (self.size, self.size)
+
+    def __getitem__(self, index):
+        i, j = index
+        b = self.tile_size
+        return self.tiles[i // b, j // b, i % b, j % b]
+
+    def __setitem__(self, index, value):
+        i, j = index
+        b = self.tile_size
+        self.tiles[i // b, j // b, i % b, j % b] = value
+
+    def get_panel(self, c):
+        return np.array(self.tiles[:, c]).reshape(self.padded_size, self.tile_size)
+
+    def set_panel(self, c, panel):
+        self.tiles[:, c] = panel.reshape(self.num_tiles, self.tile_size, self.tile_size)
+
+    def get_row_block(self, r):
+        block = np.array(self.tiles[r])
+        return block.transpose(1, 0, 2).reshape(self.tile_size, self.padded_size)
+
+    def set_row_block(self, r, block):
+        block = block.reshape(self.tile_size, self.num_tiles, self.tile_size)
+        self.tiles[r] = block.transpose(1, 0, 2)
+
+    def take_columns(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        b = self.tile_size
+        values = self.tiles[:, indices // b, :, indices % b]
+        return values.transpose(1, 2, 0).reshape(self.padded_size, len(indices))[:self.size]
+
+    def take_rows(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        b = self.tile_size
+        values = self.tiles[indices // b, :, indices % b, :]
+        return values.reshape(len(indices), self.padded_size)[:, :self.size]
+
+    def subtract_product(self, left, right):
+        b = self.tile_size
+        left = self.pad_rows(left)
+        right = self.pad_rows(right.T).T
+        for r in range(self.num_tiles):
+            block = self.get_row_block(r)
+            if self.prime is None:
+                block -= left[r * b:(r + 1) * b] @ right
+            else:
+                block -= mod_matmul(left[r * b:(r + 1) * b], right, self.prime)
+                block %= self.prime
+            self.set_row_block(r, block)
+
+    def abs_max(self):
+        # One row of tiles at a time, like every other full pass.
+        return max(float(np.abs(self.tiles[r]).max()) for r in range(self.num_tiles))
+
+    def pad_rows(self, values):
+        padded = np.zeros((self.padded_size, values.shape[1]), dtype=self.tiles.dtype)
+        padded[:self.size] = values
+        return padded
+
+    def invert(self):
+        b = self.tile_size
+        pivots = np.empty(self.padded_size, dtype=np.int64)
+        for c in range(self.num_tiles):
+            panel = self.get_panel(c)
+            if self.prime is None:
+                eliminate_float_panel(panel, c * b, pivots)
+            else:
+                eliminate_panel(panel, c * b, pivots, self.prime)
+
+            # Every other panel receives the row swaps and the accumulated
+            # Gauss-Jordan transform of this panel as a single product.
+            block_rows = slice(c * b, (c + 1) * b)
+            for j in range(self.num_tiles):
+                if j == c:
+                    continue
+                other = self.get_panel(j)
+                for k in range(c * b, (c + 1) * b):
+                    p = pivots[k]
+                    if p != k:
+                        other[[k, p]] = other[[p, k]]
+                pivot_rows = other[block_rows].copy()
+                other[block_rows] = 0.0
+                if self.prime is None:
+                    other += panel @ pivot_rows
+                else:
+                    other += mod_matmul(panel, pivot_rows, self.prime)
+                    other %= self.prime
+                self.set_panel(j, other)
+            self.set_panel(c, panel)
+
+        order = np.arange(self.padded_size)
+        for k in range(self.padded_size - 1, -1, -1):
+            p = pivots[k]
+            if p != k:
+                order[[k, p]] = order[[p, k]]
+        for r in range(self.num_tiles):
+            self.set_row_block(r, self.get_row_block(r)[:, order])
+        return self
+
+    def to_array(self):
+        blocks = [self.get_row_block(r) for r in range(self.num_tiles)]
+        return np.vstack(blocks)[:self.size, :self.size]
@@ -0,0 +1,161 @@
+import numpy as np
+from modular_matrix import DEFAULT_PRIME, mod_inverse
+
+EARLY_TERMINATION = 20
+
+
+class SparseTutteMatrix:
+    def __init__(self, num_vertices, edges, p=DEFAULT_PRIME, rng=None):
+        rng = np.random.default_rng() if rng is None else rng
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.size = num_vertices
+        self.prime = p
+        values = rng.integers(1, p, len(edges))
+        rows = np.concatenate([edges[:, 0], edges[:, 1]])
+        cols = np.concatenate([edges[:, 1], edges[:, 0]])
+        data = np.concatenate([values, p - values])
+        order = np.argsort(rows, kind="stable")
+        self.indices = cols[order]
+        self.data = data[order]
+        counts = np.bincount(rows, minlength=num_vertices)
+        self.indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.indptr[1:])
+        self.nonempty = counts > 0
+
+    def matvec(self, x):
+        result = np.zeros(self.size, dtype=np.int64)
+        if len(self.data) == 0:
+            return result
+        products = self.data * x[self.indices] % self.prime
+        sums = np.add.reduceat(products, self.indptr[:-1][self.nonempty])
+        result[self.nonempty] = sums % self.prime
+        return result
+
+    def rmatvec(self, x):
+        # The Tutte matrix is skew-symmetric, so A^T x = -A x.
+        return (self.prime - self.matvec(x)) % self.prime
+
+
+class BerlekampMassey:
+    def __init__(self, p=DEFAULT_PRIME, capacity=16):
+        self.prime = p
+        self.sequence = np.zeros(capacity, dtype=np.int64)
+        self.connection = np.zeros(capacity + 1, dtype=np.int64)
+        self.connection[0] = 1
+        self.previous = self.connection.copy()
+        self.length = 0
+        self.previous_length = 0
+        self.shift = 1
+        self.last_discrepancy = 1
+        self.count = 0
+
+    def grow(self, size):
+        if size <= len(self.sequence):
+            return
+        size = max(size, 2 * len(self.sequence))
+        self.sequence = np.resize(self.sequence, size)
+        for name in ("connection", "previous"):
+            old = getattr(self, name)
+            new = np.zeros(size + 1, dtype=np.int64)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def feed(self, value):
+        p = self.prime
+        N = self.count
+        self.grow(N + 1)
+        self.sequence[N] = value
+        self.count += 1
+        L = self.length
+        window = self.sequence[N - L:N][::-1]
+        discrepancy = (int(value) + int((self.connection[1:L + 1] * window % p).sum())) % p
+        if discrepancy == 0:
+            self.shift += 1
+            return
+        factor = discrepancy * mod_inverse(self.last_discrepancy, p) % p
+        m = self.shift
+        span = min(self.previous_length + 1, len(self.connection) - m)
+        updated = self.connection.copy()
+        updated[m:m + span] = (updated[m:m + span] - self.previous[:span] * factor % p) % p
+        if 2 * L <= N:
+            self.previous = self.connection
+            self.previous_length = L
+            self.length = N + 1 - L
+            self.last_discrepancy = discrepancy
+            self.shift = 1
+        else:
+            self.shift += 1
+        self.connection = updated
+
+    def stable_steps(self):
+        return self.count - 2 * self.length
+
+    def minimal_polynomial(self):
+        # Coefficients of f(x) = x^L C(1/x), lowest degree first.
+        return self.connection[:self.length + 1][::-1].copy()
+
+
+def sequence_minimal_polynomial(apply, n, p=DEFAULT_PRIME, rng=None, early_termination=EARLY_TERMINATION):
+    rng = np.random.default_rng() if rng is None else rng
+    u = rng.integers(0, p, n)
+    v = rng.integers(0, p, n)
+    solver = BerlekampMassey(p)
+    for _ in range(2 * n + 1):
+        solver.feed(int((u * v % p).sum() % p))
+        if early_termination is not None and solver.stable_steps() >= early_termination:
+            break
+        v = apply(v)
+    return solver.minimal_polynomial()
+
+
+def sparse_rank(num_vertices, edges, p=DEFAULT_PRIME, trials=2, seed=None, early_termination=EARLY_TERMINATION):
+    if num_vertices == 0 or len(edges) == 0:
+        return 0
+    rng = np.random.default_rng(seed)
+    best = 0
+    for _ in range(trials):
+        A = SparseTutteMatrix(num_vertices, edges, p, rng)
+        # B = D1 A^T D2 A D1 is symmetric with rank(A) and, for random
+        # diagonals, a minimal polynomial of degree rank + 1 when singular.
+        d1 = rng.integers(1, p, num_vertices)
+        d2 = rng.integers(1, p, num_vertices)
+
+        def apply(x):
+            y = A.matvec(d1 * x % p)
+            return d1 * A.rmatvec(d2 * y % p) % p
+
+        polynomial = sequence_minimal_polynomial(apply, num_vertices, p, rng, early_termination)
+        degree = len(polynomial) - 1
+        rank = degree - 1 if polynomial[0] == 0 else degree
+        best = max(best, min(rank, num_vertices))
+        if best == num_vertices:
+            break
+    return best
+
+
+def sparse_matching_size(num_vertices, edges, p=DEFAULT_PRIME, trials=2, seed=None):
+    return sparse_rank(num_vertices, edges, p, trials, seed) // 2
+
+
+def sparse_has_perfect_matching(num_vertices, edges, p=DEFAULT_PRIME, trials=2, seed=None):
+    if num_vertices % 2:
+        return False
+    if num_vertices == 0:
+        return True
+    rng = np.random.default_rng(seed)
+    for _ in range(trials):
+        A = SparseTutteMatrix(num_vertices, edges, p, rng)
+        polynomial = sequence_minimal_polynomial(A.matvec, num_vertices, p, rng, early_termination=None)
+        if polynomial[0] == 0:
+            continue
+        # Certify nonsingularity by solving A x = b with the polynomial.
+        b = rng.integers(0, p, num_vertices)
+        x = np.zeros(num_vertices, dtype=np.int64)
+        power = b.copy()
+        for coefficient in polynomial[1:]:
+            x = (x + int(coefficient) * power) % p
+            power = A.matvec(power)
+        x = x * ((p - mod_inverse(polynomial[0], p)) % p) % p
+        if np.array_equal(A.matvec(x), b):
+            return True
+    return False